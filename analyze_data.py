@@ -8,6 +8,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from collections import Counter
 import numpy as np
+from script.supporting_functions import table_cache
+from script.supporting_functions.bid_store import BidStore
 
 
 # Function to calculate bidding intervals and make lists of (time-normalized, interval)
@@ -74,16 +76,22 @@ def plot_price_growth(data, output_filename):
     plt.close()
 
 
+# Bids column of a dataset, saved as strings of lists of lists, => bid store in row order
+def dataset_bid_store(data):
+    return BidStore.from_bids(eval(bids) for bids in data['bids'])
+
+
 # Main function to process and plot data for each item
 def process_and_plot_data(filename, output_directory):
-    df = pd.read_excel(filename)
+    df = table_cache.read_excel(filename)
+    store = dataset_bid_store(df)
 
-    for index, row in df.iterrows():
+    for item, (index, row) in enumerate(df.iterrows()):
         close_time = row['close_time']
-        bids_data = eval(row['bids'])  # Convert the string to a list of lists
-        normalized_time = [(bid[2] - close_time) for bid in bids_data]
-        bids = [bid[1] for bid in bids_data]
-        bidders = [bid[0] for bid in bids_data]
+        item_bidders, item_bids, item_timestamps = store[item]
+        normalized_time = (item_timestamps - close_time).tolist()
+        bids = item_bids.tolist()
+        bidders = item_bidders.tolist()
 
         intervals = calculate_intervals(normalized_time)
         active_start = find_active_start(intervals)
@@ -101,40 +109,35 @@ def process_and_plot_data(filename, output_directory):
         plot_price_growth(data, output_filename)
 
 
-# Get intervals of bids from the bidding sequence to identify bidder characteristics
-def get_intervals(bids, closing):
-    intervals = []
-    previous_time = closing
-
-    for bid in bids:
-        bidder, bid_amount, timestamp = bid
-
-        if timestamp > closing:
-            interval = timestamp - previous_time
-            intervals.append(interval)
+# Get intervals of bids from the bidding sequences to identify bidder characteristics
+# Each bid after closing is measured from the bid before it in its item, or from closing for the first bid
+# Returns the item of every interval and the intervals, in bid store order
+def get_intervals(store, closing):
+    timestamp = store.timestamp
+    closing = np.repeat(closing, store.sizes())
 
-        previous_time = timestamp
+    previous_time = np.empty_like(timestamp)
+    previous_time[1:] = timestamp[:-1]
+    first = store.offsets[:-1][store.sizes() > 0]
+    previous_time[first] = closing[first]
 
-    return intervals
+    after_closing = timestamp > closing
+    return store.items()[after_closing], (timestamp - previous_time)[after_closing]
 
 
 # Output bidding intervals for each overtime rule
 def extract_bidding_intervals(dataset_filename):
-    data = pd.read_excel(dataset_filename)
-
-    # Dictionary to store intervals by overtime_rule
-    interval_dict = {}
+    data = table_cache.read_excel(dataset_filename)
+    store = dataset_bid_store(data)
 
-    for index, row in data.iterrows():
-        overtime_rule = row["overtime_rule"]
-        closing_time = row["close_time"]
-        bids = row["bids"]
+    items, intervals = get_intervals(store, data["close_time"].to_numpy())
+    rules = data["overtime_rule"].to_numpy()[items]
 
+    # Dictionary to store intervals by overtime_rule, in order of first appearance
+    interval_dict = {}
+    for overtime_rule in data["overtime_rule"]:
         if overtime_rule not in interval_dict:
-            interval_dict[overtime_rule] = []
-
-        intervals = get_intervals(eval(bids), closing_time)
-        interval_dict[overtime_rule].extend(intervals)
+            interval_dict[overtime_rule] = intervals[rules == overtime_rule].tolist()
 
     return interval_dict
 
@@ -3,84 +3,318 @@ Auction Data Processor
 """
 
 from script import stage_1, stage_2
+from script.supporting_functions.bidder_registry import BidderRegistry
+from script.supporting_functions.ingest_manifest import IngestManifest
+from script.supporting_functions import bid_validation
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 import os
 import pandas as pd
 
+# worker processes parsing auction files in stage 1, 1 parses them one after another
+INGEST_WORKERS = os.cpu_count() or 1
+
+# format of exported tables: xlsx, csv or parquet
+EXPORT_FORMAT = "xlsx"
+
+# parse and infer only new or modified auction files, the others are read from the ingest manifest
+INCREMENTAL_INGEST = True
+
+# items flowing through the pipeline at once, files are never split across chunks
+CHUNK_ITEMS = 5000
+
+# worker processes inferring the files of a chunk in stage 2, 1 or 0 infers them one after another
+# the pipeline shares the CPUs out between these and the stage 1 workers, see pipeline_workers
+INFERENCE_WORKERS = os.cpu_count() or 1
+
+# raw auction files of the standard format, and of Auction House 4's special format with its tag table
+STANDARD_PATH = "data/standard/"
+SPECIAL_PATH = "data/special/"
+
 
 # Stage 1 - Raw XLSX Conversion to Recorded Auction Item Objects
 # (auction house data) => recorded_object
-def stage_1_main():
+def stage_1_main(workers=INGEST_WORKERS, registry=None):
     recorded_object = []
-    path = "data/standard/"
+    for _, items, _ in stage_1_stream(workers, registry):
+        recorded_object.extend(items)
+    return recorded_object
+
+
+# Stage 1 as a stream of files in sorted file order: (file, items of file, bidder ids of file)
+# With a manifest, only new or modified files are parsed and the others come from the manifest
+def stage_1_stream(workers=INGEST_WORKERS, registry=None, manifest=None):
+    if registry is None:
+        registry = stage_1.default_registry
+    jobs = stage_1_jobs()
+
+    current = [False] * len(jobs)
+    if manifest is not None:
+        manifest.prune([file for file, _, _, _ in jobs],
+                       [path for _, dependencies, _, _ in jobs for path in dependencies])
+        current = [manifest.is_parsed(file, dependencies, stage_1.PARSER_VERSION)
+                   for file, dependencies, _, _ in jobs]
+        print("%d of %d files parsed, %d from manifest" % (current.count(False), len(jobs), current.count(True)))
+
+    fresh = parse_stream([job for job, is_current in zip(jobs, current) if not is_current], workers)
+    for (file, dependencies, _, _), is_current in zip(jobs, current):
+        if is_current:
+            result = manifest.parsed(file, dependencies, stage_1.PARSER_VERSION)
+        else:
+            result = next(fresh)
+            if result is not None and manifest is not None:
+                manifest.update_parsed(file, dependencies, stage_1.PARSER_VERSION, result)
+
+        # assign global bidder ids file by file in the sorted file order, as a serial run would
+        if result is not None:
+            items = stage_1.assign_bidder_ids(*result, registry)
+            yield file, items, [registry[key] for key in result[1]]
+
+
+# parsing jobs in file order as (file, files the parse depends on, parser, arguments)
+def stage_1_jobs():
+    path = STANDARD_PATH
     dir_list = os.listdir(path)
     dir_list.sort()
 
-    # get file location and process files
+    # get file location
+    jobs = []
     files = list(map(lambda x: path + x, dir_list))
     for i in files:
-        try:
-            if i[-5:] != '.xlsx':
-                continue
-            records = stage_1.parse_auction(i)
-            recorded_object = recorded_object + records
-        except Exception as e:
-            print(e)
+        if i[-5:] != '.xlsx':
+            continue
+        jobs.append((i, (i,), stage_1.parse_auction_local, (i,)))
 
-    sp_path = "data/special/"
+    sp_path = SPECIAL_PATH
     sp_tag = "tag.xlsx"
     sp_list = os.listdir(sp_path)
     sp_list.sort()
 
     for i in sp_list:
         if i != sp_tag:
-            try:
-                if i[-5:] != '.xlsx':
-                    continue
-                records = stage_1.parse_auction_special(path=sp_path, filename=i, tagfile=sp_tag)
-                recorded_object = recorded_object + records
-            except Exception as e:
-                print(e)
+            if i[-5:] != '.xlsx':
+                continue
+            jobs.append((sp_path + i, (sp_path + i, sp_path + sp_tag),
+                         stage_1.parse_auction_special_local, (sp_path, i, sp_tag)))
 
-    return recorded_object
+    return jobs
+
+
+# parse files with local bidder keys in file order, in worker processes when more than one worker
+# Workers parse at most two files each ahead of the consumer, so parsed files do not pile up in memory
+def parse_stream(jobs, workers=INGEST_WORKERS):
+    jobs = with_tags(jobs)
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for _, _, func, args in jobs:
+                pending.append(executor.submit(func, *args))
+                if len(pending) >= 2 * workers:
+                    yield parsed_result(pending.popleft().result)
+            while pending:
+                yield parsed_result(pending.popleft().result)
+    else:
+        for _, _, func, args in jobs:
+            yield parsed_result(lambda: func(*args))
+
+
+# pass the tag table to the special file parsers, so it is loaded once per run instead of once per file
+def with_tags(jobs):
+    tags = {}
+    loaded = []
+    for file, dependencies, func, args in jobs:
+        if func is stage_1.parse_auction_special_local:
+            tagpath = args[0] + args[2]
+            if tagpath not in tags:
+                tags[tagpath] = parsed_result(lambda: stage_1.read_tag(tagpath))
+            args = args + (tags[tagpath],)
+        loaded.append((file, dependencies, func, args))
+    return loaded
+
+
+# parsed records of one file, or None after printing the error if the file could not be parsed
+def parsed_result(get_result):
+    try:
+        return get_result()
+    except Exception as e:
+        print(e)
+        return None
+
+
+# files of a stage 1 stream => lists of consecutive files with at least chunk_items items, the last may be smaller
+def chunked(parts, chunk_items=CHUNK_ITEMS):
+    chunk = []
+    count = 0
+    for part in parts:
+        if not part[1]:
+            continue
+        chunk.append(part)
+        count += len(part[1])
+        if count >= chunk_items:
+            yield chunk
+            chunk = []
+            count = 0
+    if chunk:
+        yield chunk
 
 
 # recorded_object => presentable xlsx
-def stage_1_export(recorded_object, hide_confidential_info=False):
-    stage_1.wide_form_export(recorded_object, hide_confidential_info)
+def stage_1_export(recorded_object, hide_confidential_info=False, export_format=EXPORT_FORMAT):
+    stage_1.wide_form_export(recorded_object, hide_confidential_info, export_format)
+
+
+# recorded_object => table of every irregular bid, exported when there are any
+# start_recorded marks the items whose start bid was recorded, see start_bid_recorded
+def stage_1_validate(recorded_object, export_format=EXPORT_FORMAT, start_recorded=None):
+    report = bid_validation.validation_report(recorded_object, start_recorded)
+    report_validation(report, export_format)
+    return report
+
+
+# files of a stage 1 stream => whether each of their items has a recorded start bid, special files record none
+def start_bid_recorded(parts):
+    return [not file.startswith(SPECIAL_PATH) for file, items, _ in parts for _ in items]
+
+
+# print counts of irregular bids by rule, and export the validation report when there are any
+def report_validation(report, export_format=EXPORT_FORMAT):
+    for rule, count in report["rule"].value_counts(sort=False).items():
+        print("Data Manual Check: %d bids with %s" % (count, rule))
+    if len(report) > 0:
+        bid_validation.export_report(report, export_format)
 
 
 # Stage 2 - Recorded Auction Item Objects to Inferred Auction Item Objects
 # recorded_object => inferred_object
-def stage_2_main(recorded_object):
+def stage_2_main(recorded_object, workers=INFERENCE_WORKERS):
     data = pd.DataFrame(recorded_object)
-    inferred = stage_2.process_inferred(data)
+    inferred = stage_2.process_inferred(data, workers)
     inferred_object = pd.concat([data, inferred], axis=1)
     return inferred_object
 
 
-# inferred_object => file_storage & presentable xlsx
-def stage_2_savefile(inferred_object):
-    stage_2.save_auctions(inferred_object)
-    stage_2.export_auctions(inferred_object)
+# Worker processes of stage 2, only started once a chunk has two or more files to infer
+class InferencePool:
+    def __init__(self, workers=INFERENCE_WORKERS):
+        self.workers = workers
+        self.executor = None
+
+    # executor inferring the given number of files, None when they are inferred in this process
+    def get(self, files):
+        if self.workers <= 1 or files < 2:
+            return None
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    # stop the worker processes, if they were started
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+# worker processes of stage 1 and stage 2, which run side by side in the pipeline, shared out so that together
+# they do not exceed the CPUs, stage 2 gets the CPUs stage 1 leaves and infers in this process when none are left
+def pipeline_workers(workers, inference_workers, cpus=None):
+    if cpus is None:
+        cpus = os.cpu_count() or 1
+    if workers + inference_workers <= cpus:
+        return workers, inference_workers
+    ingest = max(1, cpus * workers // (workers + inference_workers))
+    return ingest, cpus - ingest
+
+
+# Stage 2 of a chunk of files, with a manifest only items of new or modified files, or with changed bidder ids,
+# are inferred, file by file in the worker processes of the pool if there is one
+# [(file, items of file, bidder ids of file)] => inferred_object, bids sequences by overtime rule
+def stage_2_chunk(parts, manifest=None, pool=None):
+    results = [None] * len(parts)
+    if manifest is not None:
+        results = [manifest.inferred(file, bidder_ids, stage_2.INFERENCE_VERSION) for file, _, bidder_ids in parts]
+
+    stale = [i for i, cached in enumerate(results) if cached is None]
+    executor = pool.get(len(stale)) if pool is not None else None
+    inferred_parts = stage_2.infer_parts([pd.DataFrame(parts[i][1]) for i in stale], executor)
+    for i, (inferred, bids) in zip(stale, inferred_parts):
+        file, items, bidder_ids = parts[i]
+        results[i] = items, inferred, bids
+        if manifest is not None:
+            manifest.update_inferred(file, bidder_ids, stage_2.INFERENCE_VERSION, results[i])
+
+    recorded_object = []
+    all_inferred = []
+    bids_parts = []
+    item_counts = []
+    for cached in results:
+        recorded_object.extend(cached[0])
+        all_inferred.extend(cached[1])
+        bids_parts.append(cached[2])
+        item_counts.append(len(cached[0]))
+
+    data = pd.DataFrame(recorded_object)
+    inferred = stage_2.inferred_frame(all_inferred)
+    inferred_object = pd.concat([data, inferred], axis=1)
+    return inferred_object, stage_2.merge_all_bids(bids_parts, item_counts)
+
+
+# file_storage => inferred_object, optionally only some columns of the rows matching filters
+def stage_2_readfile(columns=None, filters=None):
+    return stage_2.read_auctions(columns, filters)
+
+
+# Streaming pipeline - chunks of files flow from the parsers through validation, exports and stage 2 to the
+# output files, so memory is bounded by the chunk size instead of the number of auction files
+def run_pipeline(workers=INGEST_WORKERS, registry=None, manifest=None, chunk_items=CHUNK_ITEMS,
+                 export_format=EXPORT_FORMAT, inference_workers=INFERENCE_WORKERS):
+    workers, inference_workers = pipeline_workers(workers, inference_workers)
+    stream = stage_1_stream(workers, registry, manifest)
+    pool = InferencePool(inference_workers)
+
+    confidential = stage_1.WideFormWriter(False, export_format)
+    public = stage_1.WideFormWriter(True, export_format)
+    auctions = stage_2.AuctionWriter(export_format)
 
+    reports = []
+    offset = 0
+    try:
+        for chunk in chunked(stream, chunk_items):
+            recorded_object = [item for _, items, _ in chunk for item in items]
 
-# file_storage => inferred_object
-def stage_2_readfile():
-    return stage_2.read_auctions()
+            # validation and stage 1 exports see the bids before stage 2 sorts them
+            report = bid_validation.validation_report(recorded_object, start_bid_recorded(chunk))
+            report["item"] += offset
+            reports.append(report)
+            confidential.write(recorded_object)
+            public.write(recorded_object)
 
+            inferred_object, bids = stage_2_chunk(chunk, manifest, pool)
+            auctions.write(inferred_object, bids)
+            offset += len(recorded_object)
+            print("%d items processed" % offset)
+    finally:
+        stream.close()
+        pool.shutdown()
+    confidential.close()
+    public.close()
+    auctions.close()
 
-# main script
-print("\nStage 1\n")
-recorded_object = stage_1_main()
+    print("\nValidation\n")
+    if reports:
+        report_validation(pd.concat(reports, ignore_index=True), export_format)
 
-print("\nExport file - Confidential")
-stage_1_export(recorded_object, hide_confidential_info=False)
 
-print("\nExport file - Public")
-stage_1_export(recorded_object, hide_confidential_info=True)
+# main script, guarded as stage 1 worker processes may import this file
+if __name__ == "__main__":
+    print("\nStage 1 and 2\n")
+    bidder_registry = BidderRegistry.load()
+    ingest_manifest = None
+    if INCREMENTAL_INGEST:
+        ingest_manifest = IngestManifest.load()
 
-print("\nStage 2\n")
-inferred_object = stage_2_main(recorded_object)
+    run_pipeline(registry=bidder_registry, manifest=ingest_manifest)
 
-print("\nBidding Charts Generated\n")
-stage_2_savefile(inferred_object)
+    bidder_registry.save()
+    if ingest_manifest is not None:
+        ingest_manifest.save()
+    print("\nBidding Charts Generated\n")
@@ -1,13 +1,17 @@
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import time
-import copy
+from script.supporting_functions.bidder_registry import BidderRegistry, bidder_key
+from script.supporting_functions import table_cache, table_export
 
 # Stage 1 - Standard XLSX Conversion to Recorded Auction Item Objects
 
-# - Bidder records
-generic_bidder_dict = {}
-generic_bidder_id = 0
+# - Bidder records, used by the parsers when no registry is passed in
+default_registry = BidderRegistry()
+
+# - Version of the parsers, cached parses of an older version are parsed again
+PARSER_VERSION = 2
 
 
 # - Datetime object => Unix timestamp
@@ -15,105 +19,142 @@ def to_timestamp(date_time):
     return time.mktime(date_time.timetuple())
 
 
-# - Validation for irregular data
-def validator_bids(bids, start_bid):
-    bids.sort(key=lambda x: x[1], reverse=False)
-    if bids[0][1] < start_bid:
-        return "Data Manual Check: Start bid larger than first bid."
-
-    _time = bids[0][2]
-    for i in bids:
-        if _time > i[2]:
-            return "Data Manual Check: Incorrect order at " + str(i)
-        _time = i[2]
-    return ""
+# - Datetime series => Unix timestamps as to_timestamp gives, the local time offset is looked up once per hour
+def to_timestamps(date_times):
+    _epoch = pd.Timestamp(1970, 1, 1)
+    _naive = (date_times - _epoch) // pd.Timedelta(seconds=1)
+    _hours = date_times.dt.floor('h')
+    _offsets = {h: (h - _epoch) // pd.Timedelta(seconds=1) - to_timestamp(h) for h in _hours.unique()}
+    return (_naive - _hours.map(_offsets)).to_numpy(dtype=float)
+
+
+# - Unix timestamps => local "%Y-%m-%d %H:%M:%S" strings as datetime.fromtimestamp gives
+# - - The local time offset is looked up once per quarter hour, the finest step of time zone changes
+def format_timestamps(timestamps):
+    _timestamps = np.asarray(timestamps, dtype=float)
+    _seconds = np.floor(_timestamps)
+
+    # fromtimestamp rounds to microseconds before the fraction is dropped
+    _seconds = (_seconds + (np.round((_timestamps - _seconds) * 1e6) >= 1e6)).astype(np.int64)
+    _quarters, _inverse = np.unique(_seconds // 900 * 900, return_inverse=True)
+    _epoch = datetime(1970, 1, 1)
+    _offsets = np.array([(datetime.fromtimestamp(q) - _epoch).total_seconds() - q for q in _quarters.tolist()],
+                        dtype=np.int64)
+    _local = (_seconds + _offsets[_inverse]).astype('datetime64[s]')
+    return np.char.replace(np.datetime_as_string(_local, unit='s'), 'T', ' ').tolist()
+
+
+# - Bidder ID assignment
+# - - Local bidder keys of parsed auction items => registry bidder ids, in the order the keys were first met
+def assign_bidder_ids(auction_data, bidder_keys, registry=None):
+    if registry is None:
+        registry = default_registry
+
+    registry.register(bidder_keys)
+    for item in auction_data:
+        for bid in item['bids']:
+            bid[0] = registry[bid[0]]
+    return auction_data
 
 
 # - Main Parser
 # - - Auction house standardized xlsx => Python list of auction items' basic info
-def parse_auction(filename):
-    # Inherit global dictionary and bidder id
-    global generic_bidder_id, generic_bidder_dict
+def parse_auction(filename, registry=None):
+    return assign_bidder_ids(*parse_auction_local(filename), registry)
 
-    # Create all possible token values for anonymous bidders
-    anonymous_token = list(map(lambda x: str(x), range(100, 9999)))
-    anonymous_token += list(map(lambda x: x + '号', anonymous_token))
 
+# - - Auction house standardized xlsx => auction items with local bidder keys, bidder keys in order of first bid
+# - - Does not touch the global bidder records, so files can be parsed in parallel
+def parse_auction_local(filename):
     # start parsing specific auction
     print(filename)
 
-    # read data
-    data = pd.read_excel(filename, index_col=0)
+    # read data, items without a name are skipped
+    data = table_cache.read_excel(filename, index_col=0)
+    data = data[data.iloc[:, 3].notnull()]
+
+    # extract item demographics
+    auction_nos = list(map(str, data.iloc[:, 0].tolist()))
+    _full_times = pd.to_datetime(data.iloc[:, 5].astype(str), format='%Y%m%d%H%M%S')
+    close_times = to_timestamps(_full_times)
+    _item_dates = _full_times.dt.normalize().to_numpy()
+
+    # repeating (bidder, price, time) column groups => one column per bid slot
+    _slots = data.iloc[:, 6:].astype(object).to_numpy()
+    if _slots.shape[1] % 3 != 0:
+        _padding = np.full((len(_slots), 3 - _slots.shape[1] % 3), np.nan, dtype=object)
+        _slots = np.hstack([_slots, _padding])
+    bidders = _slots[:, 0::3]
+    prices = _slots[:, 1::3]
+    times = _slots[:, 2::3]
+
+    # bids of an item end at its first empty bidder
+    listed = np.cumprod(pd.notnull(bidders), axis=1).astype(bool)
+    _rows = np.nonzero(listed)[0]
+
+    # parse all bid times at once, HHMMSS numbers on the item's close date
+    _numbers = pd.to_numeric(pd.Series(times[listed]), errors='coerce')
+    _clock = pd.to_datetime(np.trunc(_numbers).astype('Int64').astype(str).str.zfill(6), format='%H%M%S',
+                            errors='coerce')
+    readable = np.ones(listed.shape, dtype=bool)
+    readable[listed] = _clock.notna().to_numpy()
+
+    # an unreadable time ends the bids of its item, its bidder is still registered as in a row by row walk
+    unreadable = listed & ~readable
+    registered = listed & (np.cumsum(unreadable, axis=1) - unreadable == 0)
+    kept = registered & readable
+    for value in times[unreadable & registered]:
+        print("Unreadable bid time: " + str(value))
+
+    _seconds = (_clock - pd.Timestamp(1900, 1, 1)).to_numpy()
+    _bid_times = pd.Series(_item_dates[_rows] + _seconds)[kept[listed]]
+    timestamps = to_timestamps(_bid_times)
+
+    # Non-unique tokens can be different bidder in multiple auctions.
+    _keys = bidders[registered]
+    _auction_nos = np.array(auction_nos, dtype=object)[np.nonzero(registered)[0]]
+    _keys = np.array([bidder_key(auction_no, key) for auction_no, key in zip(_auction_nos.tolist(), _keys.tolist())],
+                     dtype=object)
+    bidder_keys = pd.unique(_keys).tolist()
+
+    # long bid table => per item bids lists
+    _kept_keys = _keys[kept[registered]].tolist()
+    _kept_prices = prices[kept].tolist()
+    timestamps = timestamps.tolist()
+    _ends = np.cumsum(kept.sum(axis=1))
+
     auction_data = []
-    for i in data.itertuples():
-        if pd.isnull(i[4]):
-            continue
-
-        # extract item demographics
-        auction_house = i[0]
-        auction_no = str(i[1])
-        overtime_rule = i[2]
-        item_index = i[3]
-        item_name = i[4]
-        item_start_bid = i[5]
-
-        _full_time = datetime.strptime(str(i[6]), '%Y%m%d%H%M%S')
-        item_close_time = to_timestamp(_full_time)
-        _item_date = _full_time.date()
-        _item_time = _full_time.time()
-        item_bids = []
-
-        # extract item bids
-        _loc = 7
-        _end = False
-
-        try:
-            while _end is False:
-                if pd.isnull(i[_loc]):
-                    _end = True
-                else:
-                    _bid_bidder = i[_loc]
-                    # Non-unique tokens can be different bidder in multiple auctions.
-                    if i[_loc] in anonymous_token:
-                        _bid_bidder = str(auction_no) + "__"+ str(i[_loc])
-                    if _bid_bidder in generic_bidder_dict:
-                        _bidder = generic_bidder_dict[_bid_bidder]
-                    else:
-                        generic_bidder_dict[_bid_bidder] = generic_bidder_id
-                        _bidder = generic_bidder_id
-                        generic_bidder_id += 1
-
-                    _price = i[_loc + 1]
-                    _to_time = str(int(i[_loc + 2])).rjust(6, '0')
-                    _bid_time = datetime.strptime(_to_time, '%H%M%S').time()
-                    _timestamp = to_timestamp(datetime.combine(_item_date, _bid_time))
-
-                    _loc += 3
-
-                    item_bids.append([_bidder, _price, _timestamp])
-
-        except Exception as e:
-            _end = True
-            if type(e) is not IndexError:
-                print(e)
-
-        _eval = validator_bids(item_bids, item_start_bid)
-        if _eval != "":
-            print(_eval)
-
-        auction_data.append({"auction_house": auction_house, "auction_no": str(auction_no),
-                             "overtime_rule": overtime_rule,
-                             "index": item_index, "name": item_name, "start_bid": item_start_bid,
-                             "close_time": item_close_time, "bids": item_bids})
-    return auction_data
+    _start = 0
+    for row, item in enumerate(data.itertuples()):
+        item_bids = [[_kept_keys[b], _kept_prices[b], timestamps[b]] for b in range(_start, _ends[row])]
+        _start = _ends[row]
+
+        # bids are kept in price order, irregular data is reported by the bulk validation after stage 1
+        if not item_bids:
+            raise ValueError("Data Manual Check: No bids for item " + str(item[3]))
+        item_bids.sort(key=lambda x: x[1], reverse=False)
+
+        auction_data.append({"auction_house": item[0], "auction_no": auction_nos[row],
+                             "overtime_rule": item[2],
+                             "index": item[3], "name": item[4], "start_bid": item[5],
+                             "close_time": close_times[row], "bids": item_bids})
+    return auction_data, bidder_keys
+
+
+# - Item tag table of Auction House 4's special data format
+def read_tag(tagpath):
+    return table_cache.read_excel(tagpath)
 
 
 # - Parser for Auction House 4's special data format
 # - - Auction house specific xlsx => Python list of auction items' basic info
-def parse_auction_special(path, filename, tagfile):
-    # Inherit global dictionary and bidder id
-    global generic_bidder_id, generic_bidder_dict
+def parse_auction_special(path, filename, tagfile, registry=None, tag=None):
+    return assign_bidder_ids(*parse_auction_special_local(path, filename, tagfile, tag), registry)
+
 
+# - - Auction house specific xlsx => auction items with local bidder keys, bidder keys in order of first bid
+# - - The tag table is read from tagfile unless it was already loaded for the run
+def parse_auction_special_local(path, filename, tagfile, tag=None):
     filepath = path + filename
     tagpath = path + tagfile
 
@@ -124,113 +165,112 @@ def parse_auction_special(path, filename, tagfile):
     auction_no = int(filename[:4])
 
     # read data and item tag
-    data = pd.read_excel(filepath)
-    tag = pd.read_excel(tagpath)
-
-    item_dict = {}
-    for i in tag.itertuples():
-        if i[2] == auction_no:
-            auction_house = i[1]
-            overtime_rule = i[3]
-            index = i[4]
-            item_dict[index] = [auction_house,
-                               overtime_rule,
-                               to_timestamp(datetime.strptime(str(i[5]), '%Y%m%d%H%M%S'))]
-
+    data = table_cache.read_excel(filepath)
+    if tag is None:
+        tag = read_tag(tagpath)
+
+    # item tags of this auction joined on item index, a later tag of the same item replaces an earlier one
+    _tag = tag[tag.iloc[:, 1] == auction_no]
+    _tag = _tag.drop_duplicates(subset=_tag.columns[3], keep='last')
+    _close = to_timestamps(pd.to_datetime(_tag.iloc[:, 4].astype(str), format='%Y%m%d%H%M%S'))
+    item_dict = dict(zip(_tag.iloc[:, 3].tolist(),
+                         zip(_tag.iloc[:, 0].tolist(), _tag.iloc[:, 2].tolist(), _close.tolist())))
+
+    # items in order of first row, ignoring unexpected items and unsuccessful items without a first bid time
+    _index = data.iloc[:, 0]
+    _first = ~_index.duplicated() & _index.notna()
+    items = [index for index, first_time in zip(_index[_first].tolist(), data.iloc[:, 5][_first].tolist())
+             if index in item_dict and str(first_time) != 'nan']
+
+    # rows of all kept items, wherever they are in the file, with all bid times parsed at once
+    _rows = data[_index.isin(items)]
+    _times = to_timestamps(pd.to_datetime(_rows.iloc[:, 5].astype(str), format='%Y-%m-%d %H:%M:%S')).tolist()
+    _names = _rows.iloc[:, 1].tolist()
+    _bidders = _rows.iloc[:, 3].tolist()
+    _prices = _rows.iloc[:, 4].tolist()
+    _positions = _rows.groupby(_rows.iloc[:, 0], sort=False).indices
+    bidder_keys = pd.unique(_rows.iloc[:, 3]).tolist()
+
+    # rows of an item run from the latest bid to the earliest
+    # the format records no start bid, the price of the latest bid stands in for it as it always has
     auction_data = []
-    current = None
-    bid_history = []
-    item = {}
-    for i in data.itertuples():
-        if current != i[1]:
-            current = i[1]
-
-            # ignore unexpected item in data
-            if current not in item_dict:
-                continue
-
-            # ignore unsuccessful items
-            if str(i[6]) == 'nan':
-                continue
-
-            item_tag = item_dict[current]
-            bid_history.reverse()
-            item['bids'] = bid_history
-            auction_data.append(item)
-            item = {}
-            bid_history = []
-            item["auction_house"] = item_tag[0]
-            item["auction_no"] = str(auction_no)
-            item["overtime_rule"] = item_tag[1]
-            item['index'] = current
-            item['name'] = i[2]
-            item['start_bid'] = i[5]
-            item['close_time'] = item_tag[2]
-            if i[4] in generic_bidder_dict:
-                bidder = generic_bidder_dict[i[4]]
-            else:
-                bidder = generic_bidder_id
-                generic_bidder_id += 1
-                generic_bidder_dict[i[4]] = bidder
-            bid_time = to_timestamp(datetime.strptime(str(i[6]), '%Y-%m-%d %H:%M:%S'))
-            bid = [bidder, i[5], bid_time]
-            bid_history.append(bid)
-        else:
-            if current in item_dict:
-                bid_time = to_timestamp(datetime.strptime(str(i[6]), '%Y-%m-%d %H:%M:%S'))
-                if i[4] in generic_bidder_dict:
-                    bidder = generic_bidder_dict[i[4]]
-                else:
-                    bidder = generic_bidder_id
-                    generic_bidder_id += 1
-                    generic_bidder_dict[i[4]] = bidder
-                bid = [bidder, i[5], bid_time]
-                bid_history.append(bid)
-    return auction_data[1:]
-
-
-# recorded_object => presentable xlsx
-def wide_form_export(recorded_object, hide_confidential_info):
-    wide_form = []
-    counter = 0
-    filename = datetime.now().strftime("auction_data_%Y%m%d_%H%M%S")
-    if hide_confidential_info:
-        filename += "_public"
-    filename += ".xlsx"
-
-    for i in recorded_object:
-        counter += 1
-        auction_house = i['auction_house']
-        auction_no = i['auction_no']
-        overtime_rule = i['overtime_rule']
-        item_index = i['index']
-        close_time = i['close_time']
-        bids = i['bids']
-        sortedbids = copy.deepcopy(bids)
-        sortedbids.sort(key=lambda x: x[1])
+    for index in items:
+        positions = _positions[index]
+        first = positions[0]
+        item_tag = item_dict[index]
+        auction_data.append({
+            "auction_house": item_tag[0],
+            "auction_no": str(auction_no),
+            "overtime_rule": item_tag[1],
+            "index": index,
+            "name": _names[first],
+            "start_bid": _prices[first],
+            "close_time": item_tag[2],
+            "bids": [[_bidders[k], _prices[k], _times[k]] for k in positions[::-1]],
+        })
+    return auction_data, bidder_keys
+
+
+# recorded_object => presentable xlsx, or csv / parquet
+def wide_form_export(recorded_object, hide_confidential_info, export_format="xlsx"):
+    writer = WideFormWriter(hide_confidential_info, export_format)
+    writer.write(recorded_object)
+    writer.close()
+
+
+# Long table of all bids written chunk by chunk of recorded items, public item ids count on across chunks
+class WideFormWriter:
+    def __init__(self, hide_confidential_info, export_format="xlsx"):
+        filename = datetime.now().strftime("auction_data_%Y%m%d_%H%M%S")
         if hide_confidential_info:
-            auction_house = auction_no[0]
-            item_index = str(counter).rjust(4, '0')
-        for bid in sortedbids:
-            wide_form.append([
-                auction_house,
-                auction_no,
-                item_index,
-                overtime_rule,
-                datetime.fromtimestamp(close_time).strftime("%Y-%m-%d %H:%M:%S"),
-                bid[0],
-                bid[1],
-                datetime.fromtimestamp(bid[2]).strftime("%Y-%m-%d %H:%M:%S")
-            ])
-    wide_form = pd.DataFrame(wide_form)
-    wide_form.columns = [
-        "auction_house_id",
-        "auction_id",
-        "item_id",
-        "overtime_seconds",
-        "scheduled_closing_time",
-        "bidder_id",
-        "bid_price",
-        "bid_time",
-    ]
-    wide_form.to_excel("output/tables/" + filename, index=False)
\ No newline at end of file
+            filename += "_public"
+        self.hide_confidential_info = hide_confidential_info
+        self.counter = 0
+        self.table = table_export.TableWriter(filename, export_format)
+
+    # append the bids of recorded items
+    def write(self, recorded_object):
+        self.table.write(self.wide_form(recorded_object))
+
+    # finish the file, returns its path
+    def close(self):
+        return self.table.close()
+
+    # recorded items => long table, bids of every item sorted by price, the bid lists themselves are not copied
+    def wide_form(self, recorded_object):
+        auction_house = []
+        auction_no = []
+        item_index = []
+        overtime_rule = []
+        close_time = []
+        sizes = []
+        bids = []
+        for i in recorded_object:
+            self.counter += 1
+            sortedbids = sorted(i['bids'], key=lambda x: x[1])
+            if self.hide_confidential_info:
+                auction_house.append(i['auction_no'][0])
+                item_index.append(str(self.counter).rjust(4, '0'))
+            else:
+                auction_house.append(i['auction_house'])
+                item_index.append(i['index'])
+            auction_no.append(i['auction_no'])
+            overtime_rule.append(i['overtime_rule'])
+            close_time.append(i['close_time'])
+            sizes.append(len(sortedbids))
+            bids.extend(sortedbids)
+
+        # item columns are repeated once per bid
+        def by_bid(values):
+            return pd.Series(values, dtype=object).repeat(sizes).tolist()
+
+        return pd.DataFrame({
+            "auction_house_id": by_bid(auction_house),
+            "auction_id": by_bid(auction_no),
+            "item_id": by_bid(item_index),
+            "overtime_seconds": by_bid(overtime_rule),
+            "scheduled_closing_time": format_timestamps(by_bid(close_time)),
+            "bidder_id": [bid[0] for bid in bids],
+            "bid_price": [bid[1] for bid in bids],
+            "bid_time": format_timestamps([bid[2] for bid in bids]),
+        })
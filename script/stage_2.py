@@ -1,22 +1,61 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import seaborn as sns
 import matplotlib.pyplot as plt
-import pickle
-from script.supporting_functions import item_classifier
+from concurrent.futures import ProcessPoolExecutor
+from script.supporting_functions import item_classifier, table_export, bid_cloud
+from script.supporting_functions.bid_store import BidStoreWriter
+from script.supporting_functions.auction_dataset import AuctionDataset, DatasetWriter
 
 
 # Stage 2 - Recorded Auction Item Objects to Inferred Auction Item Objects
 
-# - Iterate by row and call row processing function
-def process_inferred(all_data):
-    all_inferred = []
-    bids_all = {}
-    for row in all_data.itertuples():
-        inferred, bids_all = process_inferred_by_row(row, bids_all)
-        all_inferred.append(inferred)
+# - Version of the inference rules, cached stage 2 rows of an older version are inferred again
+INFERENCE_VERSION = 3
 
+
+# - Items per worker chunk when process_inferred splits one frame across worker processes
+INFERENCE_CHUNK_ITEMS = 5000
+
+
+# - Infer all rows and export the bids sequences, in chunks of items in worker processes when more than one worker
+def process_inferred(all_data, workers=1, chunk_items=INFERENCE_CHUNK_ITEMS):
+    if workers > 1 and len(all_data) > chunk_items:
+        frames = [all_data.iloc[start:start + chunk_items] for start in range(0, len(all_data), chunk_items)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = infer_parts(frames, executor)
+        all_inferred = [row for inferred, _ in results for row in inferred]
+        bids_all = merge_all_bids([bids for _, bids in results], [len(frame) for frame in frames])
+    else:
+        all_inferred, bids_all = infer_rows(all_data)
     export_all_bids(bids_all)
+    return inferred_frame(all_inferred)
+
+
+# - Inferred rows and bids sequences of consecutive item frames, in the order of the frames
+# With an executor the frames are inferred in its worker processes, and the bids lists of the frames are put in
+# price order from the workers' results, so the frames end up as infer_rows leaves them
+def infer_parts(frames, executor=None):
+    if executor is None or len(frames) < 2:
+        return [infer_rows(frame) for frame in frames]
+
+    results = []
+    for frame, (inferred, bids_all, sorted_bids) in zip(frames, executor.map(infer_part, frames)):
+        for bids, sorted_list in zip(frame['bids'].tolist(), sorted_bids):
+            bids[:] = sorted_list
+        results.append((inferred, bids_all))
+    return results
+
+
+# - Inferred rows, bids sequences and bids lists in price order of one frame, in a worker process
+def infer_part(frame):
+    inferred, bids_all = infer_rows(frame)
+    return inferred, bids_all, frame['bids'].tolist()
+
+
+# - Inferred rows => named inferred columns
+def inferred_frame(all_inferred):
     all_inferred = pd.DataFrame(all_inferred)
     all_inferred.columns = [
         "item_type",
@@ -39,146 +78,172 @@ def process_inferred(all_data):
     return pd.DataFrame(all_inferred)
 
 
-# - Row processing and add inferred parameters for each auction record
-def process_inferred_by_row(row, _df_all=None):
-    if _df_all is None:
-        _df_all = {}
-    inferred = []
+# - Bids sequences by overtime rule of several parts => one dict, in part order
+def merge_all_bids(bids_parts, item_counts):
+    return bid_cloud.merge(bids_parts, item_counts)
 
-    # extracted basic data
-    overtime_rule = row[3]
-    item_name = row[5]
-    start_price = row[6]
-    closing_timestamp = row[7]
-    bids = row[8]
 
-    # eval item type
-    item_type = item_classifier.item_classifier(item_name)
-    inferred.append(item_type)
+# - Inferred rows and bids sequences by overtime rule, without exporting
+# Every inferred parameter is computed in grouped passes over the long table of all bids, ordered by item and price
+# The bids of every item are left sorted from lowest to highest price, equal prices in the order they were placed
+def infer_rows(all_data):
+    if len(all_data) == 0:
+        return [], {}
+    bids = BidTable(all_data['bids'].tolist())
+    overtime_rule = all_data['overtime_rule'].tolist()
+    start_price = np.array(all_data['start_bid'].tolist(), dtype=object)
+    closing_timestamp = np.array(all_data['close_time'].tolist(), dtype=object)
 
-    # sort bids from highest to lowest
-    bids.sort(key=lambda x: x[1], reverse=True)
+    # eval item type
+    item_type = item_classifier.classify_many(all_data['name'].tolist())
 
     # winner details
-    winning_bidder = bids[0][0]
-    inferred.append(winning_bidder)
-    winning_price = bids[0][1]
-    inferred.append(winning_price)
-    winning_timestamp = bids[0][2]
-    inferred.append(winning_timestamp)
-
-    # total bids
-    total_bids = len(bids)
-    inferred.append(total_bids)
-
-    # bid durations
+    winning = bids.winning
+    winning_bidder = bids.bidder_objects[winning]
+    winning_timestamp = bids.timestamp_objects[winning]
     overtime_length = winning_timestamp - closing_timestamp
-    inferred.append(overtime_length)
-
-    # bidder demographics and bid history
-    # active bidding definition: two bids placed within 3 minutes interval (180 seconds)
-    bids.sort(key=lambda x: x[1], reverse=False)
-
-    _list_bidders = set()
-    _counter_normal_bids = 0
-    _list_overtime_bidders = set()
-    _pointer = False
-    _active = False
-    _last_bid = start_price
-    _last_time = closing_timestamp
-
-    time_to_close = -1
-    bid_before_close = start_price
-
-    for i in bids:
-        if _pointer is False:
-            if i[2] > closing_timestamp:
-                _pointer = True
-                bid_before_close = _last_bid
-                time_to_close = closing_timestamp - _last_time
-                if i[0] not in _list_bidders and i[0] not in _list_overtime_bidders:
-                    _list_overtime_bidders.add(i[0])
-            else:
-                _counter_normal_bids += 1
-                _last_time = i[2]
-                _last_bid = i[1]
-                if i[0] not in _list_bidders:
-                    _list_bidders.add(i[0])
-        elif i[0] not in _list_bidders and i[0] not in _list_overtime_bidders:
-            _list_overtime_bidders.add(i[0])
-
-    inferred.append(bid_before_close)
-    inferred.append(time_to_close)
-
-    # Normal and overtime bids
-    normal_bids = _counter_normal_bids
-    overtime_bids = total_bids - normal_bids
-    inferred.append(normal_bids)
-    inferred.append(overtime_bids)
-
-    # check if winning bidder enters in overtime
-    if winning_bidder in _list_overtime_bidders:
-        inferred.append(True)
-    else:
-        inferred.append(False)
 
-    if overtime_length > 0:
-        inferred.append(True)
-    else:
-        inferred.append(False)
-
-    inferred.append(_list_bidders)
-    inferred.append(_list_overtime_bidders)
-    inferred.append(len(_list_bidders))
-    inferred.append(len(_list_overtime_bidders))
-
-    # draw bids in chart
-    bids_time = []
-    bids_price = []
-    bids_bidder = []
-    for i in bids:
-        bids_price.append(i[1])
-        bids_time.append(i[2])
-        bids_bidder.append(i[0])
-    bids_time = list(map(lambda x: x - closing_timestamp, bids_time))
-
-    _df = pd.DataFrame({'bids_time': bids_time, 'bids_price': bids_price, 'bidder': bids_bidder})
-
-    if overtime_rule in _df_all:
-        _df_all[overtime_rule].append(_df)
-    else:
-        _df_all[overtime_rule] = [_df, ]
+    # first bid in price order placed after the scheduled close, the bids before it are normal bids
+    position = np.arange(len(bids.items)) - bids.starts[bids.items]
+    after_close = bids.timestamp > closing_timestamp.astype(np.float64)[bids.items]
+    normal_bids = np.minimum.reduceat(np.where(after_close, position, bids.sizes[bids.items]), bids.starts)
+    is_normal = position < normal_bids[bids.items]
+
+    # price and time of the last normal bid, when bidding went on after the close
+    last_normal = bids.starts + normal_bids - 1
+    extended = normal_bids < bids.sizes
+    bid_before_close = start_price.copy()
+    time_to_close = np.full(len(bids.sizes), -1, dtype=object)
+    since_normal = extended & (normal_bids > 0)
+    only_overtime = extended & (normal_bids == 0)
+    bid_before_close[since_normal] = bids.price_objects[last_normal[since_normal]]
+    time_to_close[since_normal] = closing_timestamp[since_normal] - bids.timestamp_objects[last_normal[since_normal]]
+    time_to_close[only_overtime] = closing_timestamp[only_overtime] - closing_timestamp[only_overtime]
+
+    # bidders of normal bids, and bidders new in overtime, in the order of their first bid
+    first_bid = ~pd.DataFrame({'item': bids.items, 'bidder': bids.bidder}).duplicated().to_numpy()
+    normal_bidders = first_bid & is_normal
+    overtime_bidders = first_bid & ~is_normal
+    list_bidders = bids.bidder_sets(normal_bidders)
+    list_overtime_bidders = bids.bidder_sets(overtime_bidders)
+    count_bidders = np.bincount(bids.items[normal_bidders], minlength=len(bids.sizes))
+    count_overtime_bidders = np.bincount(bids.items[overtime_bidders], minlength=len(bids.sizes))
 
-    # check for active bidding period
-    return inferred, _df_all
-
-
-# save auctions into objects
-def save_auctions(data):
-    fileObj = open('output/object/auction_data_full.obj', 'wb')
-    pickle.dump(data, fileObj)
-    fileObj.close()
+    # check if winning bidder enters in overtime
+    is_winner_overtime = np.bincount(bids.items[overtime_bidders & (bids.bidder == bids.bidder[winning][bids.items])],
+                                     minlength=len(bids.sizes)) > 0
+    is_overtime_item = [length > 0 for length in overtime_length.tolist()]
+
+    inferred = [
+        item_type,
+        winning_bidder.tolist(),
+        bids.price_objects[winning].tolist(),
+        winning_timestamp.tolist(),
+        bids.sizes.tolist(),
+        overtime_length.tolist(),
+        bid_before_close.tolist(),
+        time_to_close.tolist(),
+        normal_bids.tolist(),
+        (bids.sizes - normal_bids).tolist(),
+        is_winner_overtime.tolist(),
+        is_overtime_item,
+        list_bidders,
+        list_overtime_bidders,
+        count_bidders.tolist(),
+        count_overtime_bidders.tolist(),
+    ]
+    all_inferred = [list(row) for row in zip(*inferred)]
+
+    # bids sequences for the charts, bid times relative to the scheduled close
+    bids.sort_lists()
+    bids_all = bid_cloud.by_rule(overtime_rule, bids.timestamp - closing_timestamp.astype(np.float64)[bids.items],
+                                 bids.price, bids.bidder, np.append(bids.starts, len(bids.items)))
+    return all_inferred, bids_all
+
+
+# Bids of all items as one long table, item by item from lowest to highest price, equal prices in placing order
+# Numeric columns are float64 for the grouped passes, the object columns keep the values as they were recorded
+class BidTable:
+    def __init__(self, all_bids):
+        self.lists = all_bids
+        self.sizes = np.array([len(bids) for bids in all_bids], dtype=np.int64)
+        self.starts = np.zeros(len(all_bids), dtype=np.int64)
+        np.cumsum(self.sizes[:-1], out=self.starts[1:])
+        if (self.sizes == 0).any():
+            raise ValueError("Data Manual Check: No bids for item " + str(int(np.argmin(self.sizes))))
+
+        flat = [bid for bids in all_bids for bid in bids]
+        items = np.repeat(np.arange(len(all_bids)), self.sizes)
+        price = np.array([bid[1] for bid in flat], dtype=np.float64)
+        self.order = np.lexsort((price, items))
+
+        # winner of every item, the first bid placed at the highest price
+        last = self.starts + self.sizes - 1
+        is_highest = price[self.order] == price[self.order][last][items]
+        self.winning = np.minimum.reduceat(np.where(is_highest, np.arange(len(items)), len(items)), self.starts)
+
+        # prices that are not numbers end up wherever the comparisons of list.sort put them,
+        # so the bids of such items are ordered by list.sort, highest price first and then lowest price first
+        for i in np.unique(items[np.isnan(price)]).tolist():
+            start = self.starts[i]
+            highest_first = sorted(range(self.sizes[i]), key=lambda j: all_bids[i][j][1], reverse=True)
+            lowest_first = sorted(highest_first, key=lambda j: all_bids[i][j][1])
+            self.order[start:start + self.sizes[i]] = start + np.array(lowest_first)
+            self.winning[i] = start + lowest_first.index(highest_first[0])
+        self.flat = [flat[i] for i in self.order]
+
+        self.items = items
+        self.price = price[self.order]
+        self.bidder_objects = np.array([bid[0] for bid in self.flat], dtype=object)
+        self.price_objects = np.array([bid[1] for bid in self.flat], dtype=object)
+        self.timestamp_objects = np.array([bid[2] for bid in self.flat], dtype=object)
+        self.bidder = self.bidder_objects.astype(np.int64)
+        self.timestamp = self.timestamp_objects.astype(np.float64)
+
+    # sets of the selected bidders of every item, each set built in bid order
+    def bidder_sets(self, selected):
+        bidders = self.bidder_objects[selected].tolist()
+        ends = np.cumsum(np.bincount(self.items[selected], minlength=len(self.sizes))).tolist()
+        return [set(bidders[start:end]) for start, end in zip([0] + ends[:-1], ends)]
+
+    # put the bids lists of the items in price order, in place
+    def sort_lists(self):
+        for bids, start, size in zip(self.lists, self.starts.tolist(), self.sizes.tolist()):
+            bids[:] = self.flat[start:start + size]
+
+
+# read auctions from the columnar dataset, only the given columns (all by default) of the rows matching all filters
+# filters are (column, operator, value), e.g. [('overtime_rule', '==', 180), ('is_overtime_item', '==', True)]
+def read_auctions(columns=None, filters=None):
+    return AuctionDataset.load().read(columns, filters)
+
+
+# export all bids sequences into one long table per overtime rule
+def export_all_bids(bids):
+    bid_cloud.save(bids)
     print("current version saved to file")
 
 
-# read auctions from objects
-def read_auctions():
-    fileObj = open('output/object/auction_data_full.obj', 'rb')
-    data = pickle.load(fileObj)
-    fileObj.close()
-    return data
-
-
-# export auctions into presentable xlsx
-def export_auctions(data):
-    filename = datetime.now().strftime("auction_data_inferred_%Y%m%d_%H%M%S")
-    filename += ".xlsx"
-    data.to_excel("output/tables/" + filename, index=False)
-
-
-# export all bids sequence into object
-def export_all_bids(bids):
-    fileObj = open('output/object/auction_bids_dict.obj', 'wb')
-    pickle.dump(bids, fileObj)
-    fileObj.close()
-    print("current version saved to file")
\ No newline at end of file
+# Stage 2 outputs written chunk by chunk of inferred auctions: auction dataset, bids sequences, bid store and table
+class AuctionWriter:
+    def __init__(self, export_format="xlsx"):
+        self.auctions = DatasetWriter()
+        self.bids = bid_cloud.BidCloudWriter()
+        self.store = BidStoreWriter()
+        filename = datetime.now().strftime("auction_data_inferred_%Y%m%d_%H%M%S")
+        self.table = table_export.TableWriter(filename, export_format)
+
+    # append inferred auctions and their bids sequences by overtime rule
+    def write(self, data, bids):
+        self.auctions.write(data)
+        self.bids.write(bids, len(data))
+        self.store.write(data['bids'])
+        self.table.write(data)
+
+    # finish all outputs
+    def close(self):
+        self.auctions.close()
+        self.bids.close()
+        self.store.close()
+        self.table.close()
+        print("current version saved to file")
\ No newline at end of file
@@ -0,0 +1,272 @@
+# Columnar dataset of inferred auctions, every column is a file of typed values under output/object/auction_dataset
+# Text is stored as utf-8 bytes with offsets, bids and bidder sets as offsets into flat value arrays
+# Reads memory-map only the columns they need, and can filter rows before the other columns are touched
+
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+DATASET_PATH = 'output/object/auction_dataset'
+SCHEMA_FILE = 'schema.obj'
+
+# kinds of values in text columns, so values that are not text come back as they were
+TEXT, INTEGER, REAL, MISSING = 0, 1, 2, 3
+
+FILTER_OPERATORS = {
+    '==': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    'in': lambda column, value: np.isin(column, list(value)),
+    'not in': lambda column, value: ~np.isin(column, list(value)),
+}
+
+
+# column file of a dataset
+def column_file(path, name, part):
+    return os.path.join(path, name + '.' + part + '.bin')
+
+
+# array stored in a column file, memory-mapped read-only unless mmap is False
+def read_array(filename, dtype, mmap=True):
+    if os.path.getsize(filename) == 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(filename, dtype=dtype, mode='r')
+    return np.fromfile(filename, dtype=dtype)
+
+
+# kind of values a column is stored as: bool, int64, float64, text, bids or set
+def column_kind(column):
+    if column.dtype.kind == 'b':
+        return 'bool'
+    if column.dtype.kind in 'iu':
+        return 'int64'
+    if column.dtype.kind == 'f':
+        return 'float64'
+    for value in column.tolist():
+        if isinstance(value, (set, frozenset)):
+            return 'set'
+        if isinstance(value, list):
+            return 'bids'
+        if value is not None:
+            break
+    return 'text'
+
+
+# Dataset written chunk by chunk of inferred auctions, the first chunk sets the columns and their kinds
+# A column of integers that meets a chunk of reals is stored as reals from then on, and a column of numbers
+# that meets a chunk of other values is stored as text, as pandas would infer the column of all values
+class DatasetWriter:
+    def __init__(self, path=DATASET_PATH):
+        self.path = path
+        self.schema = None
+        self.ends = {}
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, SCHEMA_FILE)):
+            os.remove(os.path.join(path, SCHEMA_FILE))
+
+    # append the rows of a frame
+    def write(self, frame):
+        if self.schema is None:
+            self.schema = {'columns': [(name, column_kind(frame[name])) for name in frame.columns], 'rows': 0}
+            for name, kind in self.schema['columns']:
+                self.create(name, kind)
+
+        for i, (name, kind) in enumerate(self.schema['columns']):
+            column = frame[name]
+            if kind in ('int64', 'float64') and column.dtype.kind not in 'iuf':
+                kind = self.to_text(i, name, kind)
+            elif kind == 'int64' and column.dtype.kind == 'f':
+                kind = self.to_float64(i, name)
+            if kind in ('bool', 'int64', 'float64'):
+                self.append(name, 'values', column.to_numpy(dtype=kind))
+            elif kind == 'text':
+                self.write_text(name, column.tolist())
+            elif kind == 'bids':
+                self.write_bids(name, column.tolist())
+            else:
+                self.write_sets(name, column.tolist())
+        self.schema['rows'] += len(frame)
+
+    # files of a column kind
+    @staticmethod
+    def parts(kind):
+        if kind == 'text':
+            return 'offsets', 'data', 'kinds'
+        if kind == 'bids':
+            return 'offsets', 'bidder', 'price', 'price_integral', 'timestamp', 'timestamp_integral'
+        if kind == 'set':
+            return 'offsets', 'values'
+        return 'values',
+
+    # empty files of a column
+    def create(self, name, kind):
+        for part in self.parts(kind):
+            open(column_file(self.path, name, part), 'wb').close()
+        if kind in ('text', 'bids', 'set'):
+            self.append(name, 'offsets', np.zeros(1, dtype=np.int64))
+            self.ends[name] = 0
+
+    # append an array to a column file
+    def append(self, name, part, array):
+        fileObj = open(column_file(self.path, name, part), 'ab')
+        fileObj.write(np.ascontiguousarray(array).tobytes())
+        fileObj.close()
+
+    # append offsets of consecutive sizes after the last offset of a column
+    def append_offsets(self, name, sizes):
+        offsets = self.ends[name] + np.cumsum(np.asarray(sizes, dtype=np.int64))
+        self.append(name, 'offsets', offsets)
+        if len(offsets):
+            self.ends[name] = int(offsets[-1])
+
+    # store the integers written so far as reals
+    def to_float64(self, i, name):
+        filename = column_file(self.path, name, 'values')
+        np.fromfile(filename, dtype=np.int64).astype(np.float64).tofile(filename)
+        self.schema['columns'][i] = (name, 'float64')
+        return 'float64'
+
+    # store the numbers written so far as text
+    def to_text(self, i, name, kind):
+        filename = column_file(self.path, name, 'values')
+        values = np.fromfile(filename, dtype=kind).tolist()
+        os.remove(filename)
+        self.create(name, 'text')
+        self.write_text(name, values)
+        self.schema['columns'][i] = (name, 'text')
+        return 'text'
+
+    # text values as utf-8 bytes, values that are not text are kept as their text with their kind
+    def write_text(self, name, values):
+        kinds = np.zeros(len(values), dtype=np.int8)
+        encoded = []
+        for i, value in enumerate(values):
+            if value is None:
+                kinds[i] = MISSING
+            elif isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+                kinds[i] = INTEGER
+            elif isinstance(value, (float, np.floating)):
+                kinds[i] = REAL
+            encoded.append(('' if value is None else str(value)).encode('utf-8'))
+        self.append(name, 'data', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        self.append(name, 'kinds', kinds)
+        self.append_offsets(name, [len(value) for value in encoded])
+
+    # bids lists of [bidder, price, timestamp], integer prices and timestamps are flagged to be read back as integers
+    def write_bids(self, name, all_bids):
+        flat = [bid for bids in all_bids for bid in bids]
+        self.append(name, 'bidder', np.array([bid[0] for bid in flat], dtype=np.int64))
+        for position, part in ((1, 'price'), (2, 'timestamp')):
+            values = [bid[position] for bid in flat]
+            self.append(name, part, np.array(values, dtype=np.float64))
+            self.append(name, part + '_integral', np.array([isinstance(value, (int, np.integer)) for value in values],
+                                                           dtype=bool))
+        self.append_offsets(name, [len(bids) for bids in all_bids])
+
+    # sets of bidder ids, in their iteration order
+    def write_sets(self, name, sets):
+        self.append(name, 'values', np.array([value for values in sets for value in values], dtype=np.int64))
+        self.append_offsets(name, [len(values) for values in sets])
+
+    # finish the dataset, it can be read from now on
+    def close(self):
+        if self.schema is None:
+            self.schema = {'columns': [], 'rows': 0}
+        fileObj = open(os.path.join(self.path, SCHEMA_FILE), 'wb')
+        pickle.dump(self.schema, fileObj)
+        fileObj.close()
+
+
+# Dataset opened for reading, columns are memory-mapped when they are first used
+class AuctionDataset:
+    def __init__(self, path, schema, mmap=True):
+        self.path = path
+        self.kinds = dict(schema['columns'])
+        self.columns = [name for name, _ in schema['columns']]
+        self.rows = schema['rows']
+        self.mmap = mmap
+
+    # open the dataset saved at path
+    @staticmethod
+    def load(path=DATASET_PATH, mmap=True):
+        fileObj = open(os.path.join(path, SCHEMA_FILE), 'rb')
+        schema = pickle.load(fileObj)
+        fileObj.close()
+        return AuctionDataset(path, schema, mmap)
+
+    # number of items
+    def __len__(self):
+        return self.rows
+
+    # array of a column file
+    def array(self, name, part, dtype):
+        return read_array(column_file(self.path, name, part), dtype, self.mmap)
+
+    # rows matching all filters as (column, operator, value), e.g. ('overtime_rule', '==', 180)
+    def select(self, filters):
+        mask = np.ones(self.rows, dtype=bool)
+        for name, operator, value in filters:
+            if operator not in FILTER_OPERATORS:
+                raise ValueError("unknown filter operator " + str(operator))
+            if self.kinds[name] in ('bids', 'set'):
+                raise ValueError("cannot filter on column " + name)
+            values = self.values(name, np.flatnonzero(mask))
+            if self.kinds[name] == 'text':
+                values = np.array(values, dtype=object)
+            mask[mask] = FILTER_OPERATORS[operator](values, value)
+        return np.flatnonzero(mask)
+
+    # values of a column for the given rows, scalar columns as arrays and the others as lists
+    def values(self, name, rows):
+        kind = self.kinds[name]
+        if kind in ('bool', 'int64', 'float64'):
+            return np.asarray(self.array(name, 'values', kind)[rows])
+
+        # nested values of the rows as one flat gather, split into rows afterwards
+        offsets = self.array(name, 'offsets', np.int64)
+        sizes = np.asarray(offsets[rows + 1] - offsets[rows])
+        positions = np.arange(sizes.sum()) + np.repeat(np.asarray(offsets[rows]) - np.cumsum(sizes) + sizes, sizes)
+        ends = np.cumsum(sizes).tolist()
+        starts = [0] + ends[:-1]
+
+        if kind == 'text':
+            data = self.array(name, 'data', np.uint8)[positions].tobytes()
+            kinds = self.array(name, 'kinds', np.int8)[rows].tolist()
+            text = [data[start:end].decode('utf-8') for start, end in zip(starts, ends)]
+            return [value if value_kind == TEXT else int(value) if value_kind == INTEGER
+                    else float(value) if value_kind == REAL else None for value, value_kind in zip(text, kinds)]
+        if kind == 'set':
+            values = self.array(name, 'values', np.int64)[positions].tolist()
+            return [set(values[start:end]) for start, end in zip(starts, ends)]
+
+        bidder = self.array(name, 'bidder', np.int64)[positions].tolist()
+        prices = self.numbers(name, 'price', positions)
+        timestamps = self.numbers(name, 'timestamp', positions)
+        flat = [list(bid) for bid in zip(bidder, prices, timestamps)]
+        return [flat[start:end] for start, end in zip(starts, ends)]
+
+    # reals of a bids part at the given positions as a list, integers where they were recorded as integers
+    def numbers(self, name, part, positions):
+        values = self.array(name, part, np.float64)[positions]
+        integral = self.array(name, part + '_integral', bool)[positions]
+        numbers = values.astype(object)
+        numbers[integral] = values[integral].astype(np.int64).astype(object)
+        return numbers.tolist()
+
+    # columns (all by default) of the rows matching all filters => frame indexed by row in the dataset
+    def read(self, columns=None, filters=None):
+        if columns is None:
+            columns = self.columns
+        for name in columns:
+            if name not in self.kinds:
+                raise KeyError(name)
+        rows = self.select(filters) if filters else np.arange(self.rows)
+
+        data = {name: self.values(name, rows) for name in columns}
+        index = pd.Index(rows) if filters else pd.RangeIndex(self.rows)
+        return pd.DataFrame(data, index=index, columns=columns)
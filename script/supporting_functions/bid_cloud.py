@@ -0,0 +1,158 @@
+# Bids sequences for the bidding cloud charts, one long table per overtime rule
+# Item i of a rule owns rows offsets[i] to offsets[i + 1], bid times are relative to the scheduled close
+
+import os
+import numpy as np
+from script.supporting_functions.bid_store import create_npy, append_npy, finish_npy
+
+BID_CLOUD_PATH = 'output/object/bid_cloud'
+COLUMNS = ('item_id', 'bids_time', 'bids_price', 'bidder', 'offsets')
+DTYPES = (np.int64, np.float64, np.float64, np.int64, np.int64)
+
+
+# Bids of all items of one overtime rule (item_id int64, bids_time float64, bids_price float64, bidder int64)
+# item_id is the row of the item in the saved auctions, offsets are int64
+class RuleBids:
+    def __init__(self, item_id, bids_time, bids_price, bidder, offsets):
+        self.item_id = item_id
+        self.bids_time = bids_time
+        self.bids_price = bids_price
+        self.bidder = bidder
+        self.offsets = offsets
+
+    # number of items
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # bids of item i as a mapping of column name to views into the table
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {'bids_time': self.bids_time[start:end], 'bids_price': self.bids_price[start:end],
+                'bidder': self.bidder[start:end]}
+
+    # bids of every item in item order
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    # number of bids of every item
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    # tables of consecutive items of the rule => one table, item ids are kept
+    @staticmethod
+    def concat(tables):
+        offsets = [np.zeros(1, dtype=np.int64)]
+        total = 0
+        for table in tables:
+            offsets.append(np.asarray(table.offsets[1:]) + total)
+            total += int(table.offsets[-1])
+        return RuleBids(*(np.concatenate([getattr(table, name) for table in tables]) for name in COLUMNS[:-1]),
+                        np.concatenate(offsets))
+
+    # same table with item ids moved by shift, for items saved after others
+    def shifted(self, shift):
+        return RuleBids(self.item_id + shift, self.bids_time, self.bids_price, self.bidder, self.offsets)
+
+    # save table as a directory of .npy files that can be memory-mapped
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in COLUMNS:
+            np.save(os.path.join(path, name + '.npy'), np.asarray(getattr(self, name)))
+
+    # read table from a directory, memory-mapped read-only unless mmap is False
+    @staticmethod
+    def load(path, mmap=True):
+        mode = 'r' if mmap else None
+        return RuleBids(*(np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name in COLUMNS))
+
+
+# overtime rule as a key of the tables and the name of its directory, integral rules as int so 180 and 180.0 are
+# the same rule whichever type the overtime column was read as
+def rule_key(rule):
+    rule = float(rule)
+    return int(rule) if rule.is_integer() else rule
+
+
+# per-item bid columns in item order with the overtime rule of each item => {overtime rule: RuleBids}
+# the bids of item i are rows offsets[i] to offsets[i + 1] of the columns, rules are kept in order of first item
+def by_rule(overtime_rule, bids_time, bids_price, bidder, offsets):
+    overtime_rule = np.asarray(overtime_rule)
+    sizes = np.diff(offsets)
+    rows = np.repeat(overtime_rule, sizes)
+    items = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+
+    tables = {}
+    for rule in dict.fromkeys(overtime_rule.tolist()):
+        selected = rows == rule
+        rule_offsets = np.zeros(np.count_nonzero(overtime_rule == rule) + 1, dtype=np.int64)
+        np.cumsum(sizes[overtime_rule == rule], out=rule_offsets[1:])
+        tables[rule_key(rule)] = RuleBids(items[selected], bids_time[selected], bids_price[selected], bidder[selected],
+                                rule_offsets)
+    return tables
+
+
+# {overtime rule: RuleBids} of consecutive parts => one dict in order of first appearance, item ids of each part
+# are moved past the items of the parts before it
+def merge(parts, item_counts):
+    tables = {}
+    shift = 0
+    for part, count in zip(parts, item_counts):
+        for rule, table in part.items():
+            tables.setdefault(rule, []).append(table.shifted(shift))
+        shift += count
+    return {rule: RuleBids.concat(rule_tables) for rule, rule_tables in tables.items()}
+
+
+# save {overtime rule: RuleBids} as one directory per rule, with the rules listed in rules.npy
+def save(tables, path=BID_CLOUD_PATH):
+    os.makedirs(path, exist_ok=True)
+    for rule, table in tables.items():
+        table.save(os.path.join(path, str(rule_key(rule))))
+    np.save(os.path.join(path, 'rules.npy'), np.array(list(tables), dtype=np.float64))
+
+
+# read {overtime rule: RuleBids}, memory-mapped read-only unless mmap is False
+def load(path=BID_CLOUD_PATH, mmap=True):
+    rules = [rule_key(rule) for rule in np.load(os.path.join(path, 'rules.npy')).tolist()]
+    return {rule: RuleBids.load(os.path.join(path, str(rule)), mmap) for rule in rules}
+
+
+# {overtime rule: RuleBids} written chunk by chunk of items, every rule directory grows as its chunks arrive
+# item ids of a chunk are moved past the items of the chunks before it, rules are listed in order of first appearance
+class BidCloudWriter:
+    def __init__(self, path=BID_CLOUD_PATH):
+        self.path = path
+        self.shift = 0
+        self.ends = {}
+        os.makedirs(path, exist_ok=True)
+
+    # .npy file of a column of a rule
+    def filename(self, rule, name):
+        return os.path.join(self.path, str(rule), name + '.npy')
+
+    # append {overtime rule: RuleBids} of the next count items
+    def write(self, tables, count):
+        for rule, table in tables.items():
+            rule = rule_key(rule)
+            if rule not in self.ends:
+                os.makedirs(os.path.join(self.path, str(rule)), exist_ok=True)
+                for name, dtype in zip(COLUMNS, DTYPES):
+                    create_npy(self.filename(rule, name), dtype)
+                append_npy(self.filename(rule, 'offsets'), np.zeros(1), np.int64)
+                self.ends[rule] = 0
+
+            append_npy(self.filename(rule, 'item_id'), np.asarray(table.item_id) + self.shift, np.int64)
+            for name, dtype in zip(COLUMNS[1:-1], DTYPES[1:-1]):
+                append_npy(self.filename(rule, name), getattr(table, name), dtype)
+            append_npy(self.filename(rule, 'offsets'), np.asarray(table.offsets[1:]) + self.ends[rule], np.int64)
+            self.ends[rule] += int(table.offsets[-1])
+        self.shift += count
+
+    # finish the files and list the rules, the tables can be loaded from now on
+    def close(self):
+        for rule in self.ends:
+            for name, dtype in zip(COLUMNS, DTYPES):
+                finish_npy(self.filename(rule, name), dtype)
+        np.save(os.path.join(self.path, 'rules.npy'), np.array(list(self.ends), dtype=np.float64))
@@ -0,0 +1,137 @@
+# Columnar store of all bids, item i owns bids offsets[i] to offsets[i + 1] of the bid arrays
+
+import os
+import numpy as np
+
+BID_STORE_PATH = 'output/object/bid_store'
+COLUMNS = ('bidder', 'price', 'timestamp', 'offsets')
+DTYPES = (np.int32, np.float64, np.int64, np.int64)
+
+
+# header of a one dimensional .npy file, the same size for any length so it can be rewritten once the file is complete
+def write_npy_header(fileObj, dtype, length):
+    np.lib.format.write_array_header_1_0(fileObj, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                   'fortran_order': False, 'shape': (length,)})
+
+
+# empty .npy file of a column that grows by appending
+def create_npy(filename, dtype):
+    fileObj = open(filename, 'wb')
+    write_npy_header(fileObj, dtype, 0)
+    fileObj.close()
+
+
+# append values to the column of a .npy file
+def append_npy(filename, array, dtype):
+    fileObj = open(filename, 'ab')
+    fileObj.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+    fileObj.close()
+
+
+# write the length of the appended values into the header of a .npy file, after which it can be loaded
+def finish_npy(filename, dtype):
+    fileObj = open(filename, 'r+b')
+    write_npy_header(fileObj, dtype, 0)
+    header = fileObj.tell()
+    length = (os.path.getsize(filename) - header) // np.dtype(dtype).itemsize
+    fileObj.seek(0)
+    write_npy_header(fileObj, dtype, length)
+    if fileObj.tell() != header:
+        raise ValueError("header of " + filename + " changed size")
+    fileObj.close()
+
+
+# Bids of all items as contiguous arrays (bidder id int32, price float64, timestamp int64) with int64 item offsets
+class BidStore:
+    def __init__(self, bidder, price, timestamp, offsets):
+        self.bidder = bidder
+        self.price = price
+        self.timestamp = timestamp
+        self.offsets = offsets
+
+    # number of items
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # bids of item i as (bidder, price, timestamp) views into the store
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.bidder[start:end], self.price[start:end], self.timestamp[start:end]
+
+    # number of bids of every item
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    # item of every bid
+    def items(self):
+        return np.repeat(np.arange(len(self)), self.sizes())
+
+    # bids of item i as the pipeline's list of [bidder, price, timestamp]
+    def to_list(self, i):
+        bidder, price, timestamp = self[i]
+        return [list(bid) for bid in zip(bidder.tolist(), price.tolist(), timestamp.tolist())]
+
+    # iterable of per-item lists of [bidder, price, timestamp] => store
+    @staticmethod
+    def from_bids(all_bids):
+        sizes = []
+        flat = []
+        for bids in all_bids:
+            sizes.append(len(bids))
+            flat.extend(bids)
+
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        if not flat:
+            return BidStore(np.zeros(0, np.int32), np.zeros(0, np.float64), np.zeros(0, np.int64), offsets)
+
+        bidder, price, timestamp = zip(*flat)
+        return BidStore(np.array(bidder, dtype=np.int32), np.array(price, dtype=np.float64),
+                        np.array(timestamp, dtype=np.int64), offsets)
+
+    # save store as one .npz file, or as a directory of .npy files that can be memory-mapped
+    def save(self, path=BID_STORE_PATH):
+        arrays = {name: np.asarray(getattr(self, name)) for name in COLUMNS}
+        if path.endswith('.npz'):
+            np.savez(path, **arrays)
+            return
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), array)
+
+    # read store from a .npz file or a directory, directories are memory-mapped read-only unless mmap is False
+    @staticmethod
+    def load(path=BID_STORE_PATH, mmap=True):
+        if path.endswith('.npz'):
+            with np.load(path) as arrays:
+                return BidStore(*(arrays[name] for name in COLUMNS))
+        mode = 'r' if mmap else None
+        return BidStore(*(np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name in COLUMNS))
+
+
+# Store written chunk by chunk of items into a directory of .npy files, item offsets continue across chunks
+class BidStoreWriter:
+    def __init__(self, path=BID_STORE_PATH):
+        self.path = path
+        self.end = 0
+        os.makedirs(path, exist_ok=True)
+        for name, dtype in zip(COLUMNS, DTYPES):
+            create_npy(self.filename(name), dtype)
+        append_npy(self.filename('offsets'), np.zeros(1), np.int64)
+
+    # .npy file of a column
+    def filename(self, name):
+        return os.path.join(self.path, name + '.npy')
+
+    # append the bids of items, per-item lists of [bidder, price, timestamp]
+    def write(self, all_bids):
+        store = BidStore.from_bids(all_bids)
+        for name, dtype in zip(COLUMNS[:-1], DTYPES):
+            append_npy(self.filename(name), getattr(store, name), dtype)
+        append_npy(self.filename('offsets'), store.offsets[1:] + self.end, np.int64)
+        self.end += int(store.offsets[-1])
+
+    # finish the files, the store can be loaded from now on
+    def close(self):
+        for name, dtype in zip(COLUMNS, DTYPES):
+            finish_npy(self.filename(name), dtype)
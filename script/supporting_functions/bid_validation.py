@@ -0,0 +1,101 @@
+# Bulk validation of parsed bids, every violation is reported as one row of a table
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from script.supporting_functions.bid_store import BidStore
+from script.supporting_functions import table_export
+
+START_BID_ABOVE_FIRST_BID = "start bid above first bid"
+PRICE_NOT_MONOTONE_IN_TIME = "price not monotone in time"
+DUPLICATE_BID = "duplicate bid"
+BID_AFTER_FINAL_CLOSE = "bid after final close"
+
+
+# first bid of every item run in bids ordered by item
+def item_starts(items):
+    starts = np.ones(len(items), dtype=bool)
+    starts[1:] = items[1:] != items[:-1]
+    return starts
+
+
+# bids priced below the start bid of their item, items without a recorded start bid are not checked
+def below_start_bid(store, items, start_bid, start_recorded):
+    return np.nonzero((store.price < start_bid[items]) & start_recorded[items])[0]
+
+
+# bids placed earlier than a lower priced bid of the same item
+def not_monotone(store, items):
+    order = np.lexsort((store.price, items))
+    timestamp = store.timestamp[order]
+    earlier = np.zeros(len(order), dtype=bool)
+    earlier[1:] = timestamp[1:] < timestamp[:-1]
+    return np.sort(order[earlier & ~item_starts(items[order])])
+
+
+# repeats of a bid with the same bidder, price and time in the same item
+def duplicates(store, items):
+    bids = pd.DataFrame({'item': items, 'bidder': store.bidder, 'price': store.price, 'timestamp': store.timestamp})
+    return np.nonzero(bids.duplicated(keep='first').to_numpy())[0]
+
+
+# bids after the auction ended, a bid extends the close to the bid time plus the overtime rule
+def after_final_close(store, items, close_time, overtime_rule):
+    order = np.lexsort((store.timestamp, items))
+    timestamp = store.timestamp[order]
+    ordered_items = items[order]
+    starts = item_starts(ordered_items)
+
+    # close extended by the bid before, the first bid of an item can only meet the scheduled close
+    previous = np.empty_like(timestamp)
+    previous[1:] = timestamp[:-1]
+    extended = np.maximum(close_time[ordered_items], previous + overtime_rule[ordered_items])
+    closing = np.where(starts, close_time[ordered_items], extended)
+
+    # once a bid is late the auction had ended, so every later bid of the item is late as well
+    late = (timestamp > closing).astype(np.int64)
+    late_so_far = np.cumsum(late)
+    before_item = np.maximum.accumulate(np.where(starts, late_so_far - late, 0))
+    return np.sort(order[late_so_far - before_item > 0])
+
+
+# recorded_object => one row per offending bid with its item and the rule it breaks
+# start_recorded marks the items whose start bid was recorded, all of them by default, the special format of
+# Auction House 4 records none and its items are not checked against their start bid
+def validation_report(recorded_object, start_recorded=None):
+    store = BidStore.from_bids(item['bids'] for item in recorded_object)
+    items = store.items()
+    start_bid = np.array([item['start_bid'] for item in recorded_object], dtype=np.float64)
+    if start_recorded is None:
+        start_recorded = np.ones(len(recorded_object), dtype=bool)
+    start_recorded = np.asarray(start_recorded, dtype=bool)
+    close_time = np.array([item['close_time'] for item in recorded_object], dtype=np.float64)
+    overtime_rule = np.array([item['overtime_rule'] for item in recorded_object], dtype=np.float64)
+
+    violations = [
+        (START_BID_ABOVE_FIRST_BID, below_start_bid(store, items, start_bid, start_recorded)),
+        (PRICE_NOT_MONOTONE_IN_TIME, not_monotone(store, items)),
+        (DUPLICATE_BID, duplicates(store, items)),
+        (BID_AFTER_FINAL_CLOSE, after_final_close(store, items, close_time, overtime_rule)),
+    ]
+    bids = np.concatenate([positions for _, positions in violations]).astype(np.int64)
+    rules = np.repeat([rule for rule, _ in violations], [len(positions) for _, positions in violations])
+
+    auction_no = np.array([item['auction_no'] for item in recorded_object], dtype=object)
+    item_index = np.array([item['index'] for item in recorded_object], dtype=object)
+    report = pd.DataFrame({
+        "item": items[bids],
+        "auction_no": auction_no[items[bids]],
+        "item_index": item_index[items[bids]],
+        "rule": rules.astype(object),
+        "bidder_id": store.bidder[bids],
+        "bid_price": store.price[bids],
+        "bid_time": store.timestamp[bids],
+    })
+    return report.sort_values("item", kind="stable").reset_index(drop=True)
+
+
+# validation report => presentable xlsx, or csv / parquet
+def export_report(report, export_format="xlsx"):
+    filename = datetime.now().strftime("validation_report_%Y%m%d_%H%M%S")
+    table_export.export_table(report, filename, export_format)
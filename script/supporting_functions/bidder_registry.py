@@ -0,0 +1,55 @@
+# Bidder identity records shared across auction files and runs
+
+import os
+import pickle
+
+REGISTRY_PATH = 'output/object/bidder_registry.obj'
+
+# All possible token values for anonymous bidders: 100 to 9998, with or without the 号 suffix
+ANONYMOUS_TOKENS = frozenset([str(x) for x in range(100, 9999)] + [str(x) + '号' for x in range(100, 9999)])
+
+
+# Non-unique anonymous tokens can be different bidders in multiple auctions, so they are keyed by auction
+def bidder_key(auction_no, bidder):
+    if bidder in ANONYMOUS_TOKENS:
+        return str(auction_no) + "__" + str(bidder)
+    return bidder
+
+
+# Bidder key => generic bidder id, ids are handed out in the order keys are first registered
+class BidderRegistry:
+    def __init__(self):
+        self.ids = {}
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def __getitem__(self, key):
+        return self.ids[key]
+
+    # register keys in order, keys already known keep their id
+    def register(self, keys):
+        for key in keys:
+            if key not in self.ids:
+                self.ids[key] = self.next_id
+                self.next_id += 1
+
+    # save registry into object file
+    def save(self, path=REGISTRY_PATH):
+        fileObj = open(path, 'wb')
+        pickle.dump(self, fileObj)
+        fileObj.close()
+
+    # read registry from object file, an empty registry if none was saved yet
+    @staticmethod
+    def load(path=REGISTRY_PATH):
+        if not os.path.exists(path):
+            return BidderRegistry()
+        fileObj = open(path, 'rb')
+        registry = pickle.load(fileObj)
+        fileObj.close()
+        return registry
@@ -1,18 +1,22 @@
 
 # Functions that are standalone for analysis of bids in auction data
 
-import pickle
 import seaborn as sns
 import matplotlib.pyplot as plt
 import random
+from script.supporting_functions.bid_store import BidStore
+from script.supporting_functions import bid_cloud
 
 
-# read complete record of bids saved from auction parser
-def read_all_bids():
-    fileObj = open('output/object/auction_bids_dict.obj', 'rb')
-    data = pickle.load(fileObj)
-    fileObj.close()
-    return data
+# read complete record of bids saved from auction parser as {overtime rule: long table of bids sequences}
+# memory-mapped, data[rule][i] is the bids sequence of the i-th item of the rule
+def read_all_bids(mmap=True):
+    return bid_cloud.load(mmap=mmap)
+
+
+# read columnar bids of all auctions saved from stage 2, memory-mapped so processes share one copy
+def read_bid_store(mmap=True):
+    return BidStore.load(mmap=mmap)
 
 
 # complete the bidding time-price space chart for figure 5.2
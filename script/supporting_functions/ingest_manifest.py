@@ -0,0 +1,134 @@
+# Manifest of ingested auction files, so unchanged workbooks are not parsed and inferred again
+
+import os
+import pickle
+import hashlib
+
+MANIFEST_PATH = 'output/object/ingest_manifest.obj'
+CACHE_DIRECTORY = 'output/object/ingest_cache/'
+
+
+# (size, mtime, content hash) of a file, the hash is only recomputed when size or mtime changed
+def file_signature(path, previous=None):
+    stat = os.stat(path)
+    if previous is not None and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+        return previous
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fileObj:
+        for block in iter(lambda: fileObj.read(1 << 20), b''):
+            digest.update(block)
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+# pickle an object into a file
+def write_object(filename, data):
+    fileObj = open(filename, 'wb')
+    pickle.dump(data, fileObj)
+    fileObj.close()
+
+
+# read a pickled object from a file
+def read_object(filename):
+    fileObj = open(filename, 'rb')
+    data = pickle.load(fileObj)
+    fileObj.close()
+    return data
+
+
+# Auction file path => content hashes of its dependencies, its cached local parse and stage 2 rows are kept in
+# cache files, so only the index is held in memory
+class IngestManifest:
+    def __init__(self, cache_directory=CACHE_DIRECTORY):
+        self.entries = {}
+        self.signatures = {}
+        self.checked = set()
+        self.cache_directory = cache_directory
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    # content hashes of the files a parse depends on, each file is signed at most once per run
+    def current(self, paths):
+        for path in paths:
+            if path not in self.checked:
+                self.signatures[path] = file_signature(path, self.signatures.get(path))
+                self.checked.add(path)
+        return {path: self.signatures[path][2] for path in paths}
+
+    # cache file of a file's parse or stage 2 rows
+    def cache_file(self, path, kind):
+        key = hashlib.sha256(path.encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.cache_directory, key + '.' + kind + '.obj')
+
+    # whether the cached local parse of a file is still valid
+    def is_parsed(self, path, dependencies, version):
+        entry = self.entries.get(path)
+        if entry is None or entry['version'] != version:
+            return False
+        if not os.path.exists(self.cache_file(path, 'parsed')):
+            return False
+        return entry['hashes'] == self.current(dependencies)
+
+    # cached local parse of a file, None if the file or one of its dependencies changed
+    def parsed(self, path, dependencies, version):
+        if not self.is_parsed(path, dependencies, version):
+            return None
+        return read_object(self.cache_file(path, 'parsed'))
+
+    # record a fresh local parse, which also drops the stage 2 rows of the old file content
+    def update_parsed(self, path, dependencies, version, result):
+        os.makedirs(self.cache_directory, exist_ok=True)
+        write_object(self.cache_file(path, 'parsed'), result)
+        if os.path.exists(self.cache_file(path, 'inferred')):
+            os.remove(self.cache_file(path, 'inferred'))
+        self.entries[path] = {
+            'version': version,
+            'hashes': self.current(dependencies),
+        }
+
+    # cached stage 2 (records, rows, bids) of a file, None if ids or inference changed since
+    def inferred(self, path, bidder_ids, version):
+        if path not in self.entries or not os.path.exists(self.cache_file(path, 'inferred')):
+            return None
+        inferred_version, inferred_ids, result = read_object(self.cache_file(path, 'inferred'))
+        if inferred_version != version or inferred_ids != bidder_ids:
+            return None
+        return result
+
+    # record stage 2 results of a file
+    def update_inferred(self, path, bidder_ids, version, result):
+        if path in self.entries:
+            write_object(self.cache_file(path, 'inferred'), (version, bidder_ids, result))
+
+    # forget files that are no longer ingested, and signatures of files that no ingested file depends on
+    def prune(self, paths, dependencies=()):
+        for path in set(self.entries) - set(paths):
+            for kind in ('parsed', 'inferred'):
+                if os.path.exists(self.cache_file(path, kind)):
+                    os.remove(self.cache_file(path, kind))
+            del self.entries[path]
+        for path in set(self.signatures) - set(paths) - set(dependencies):
+            del self.signatures[path]
+
+    # save manifest index into object file
+    def save(self, path=MANIFEST_PATH):
+        write_object(path, self)
+
+    # read manifest from object file, an empty manifest if none was saved yet
+    @staticmethod
+    def load(path=MANIFEST_PATH):
+        if not os.path.exists(path):
+            return IngestManifest()
+        manifest = read_object(path)
+
+        # manifests holding the cached parses themselves were saved by an older version, they are rebuilt
+        if not hasattr(manifest, 'cache_directory'):
+            return IngestManifest()
+
+        # signatures are checked again on every run
+        manifest.checked = set()
+        return manifest
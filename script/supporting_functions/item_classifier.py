@@ -140,27 +140,90 @@ ancient_literature_primary = [
 ]
 
 
-# classifies items according to the keyword lists and scores
-def item_classifier(item_name):
-    calligraphy_score = 0
-    drawing_score = 0
-    ancient_literature_score = 0
-    for i in calligraphy_primary:
-        if i in item_name:
-            calligraphy_score += 15
+# keyword lists with the item type they score for and the score of each keyword found
+KEYWORD_WEIGHTS = [
+    (calligraphy_primary, "calligraphy", 15),
+    (drawing_primary, "drawing", 8),
+    (drawing_secondary, "drawing", 5),
+    (ancient_literature_primary, "ancient_literature", 11),
+]
+SCORED_TYPES = ("calligraphy", "drawing", "ancient_literature")
+
+# item types of names classified so far, names repeat across auctions
+CLASSIFIED_LIMIT = 1 << 16
+
+
+# keyword => scores by item type, a keyword listed more than once scores once for every time it is listed
+def keyword_scores():
+    scores = {}
+    for keywords, item_type, weight in KEYWORD_WEIGHTS:
+        for keyword in keywords:
+            scores.setdefault(keyword, [0] * len(SCORED_TYPES))[SCORED_TYPES.index(item_type)] += weight
+    return scores
+
+
+# Aho-Corasick automaton of all keywords, finds every keyword in a name in one pass over its characters
+class KeywordMatcher:
+    def __init__(self, scores):
+        self.keywords = list(scores)
+        self.scores = [tuple(scores[keyword]) for keyword in self.keywords]
+
+        # trie of the keywords, a node is a dict of character => next node
+        goto = [{}]
+        self.output = [()]
+        for i, keyword in enumerate(self.keywords):
+            node = 0
+            for character in keyword:
+                if character not in goto[node]:
+                    goto.append({})
+                    self.output.append(())
+                    goto[node][character] = len(goto) - 1
+                node = goto[node][character]
+            self.output[node] += (i,)
+
+        # failure links in breadth first order, a node also outputs the keywords of the node it fails to
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for character, child in goto[node].items():
+                queue.append(child)
+                fallback = fail[node]
+                while fallback and character not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(character, 0)
+                self.output[child] += self.output[fail[child]]
 
-    for i in drawing_primary:
-        if i in item_name:
-            drawing_score += 8
+        # transitions of every node with the failure links followed in advance, one lookup per character
+        self.delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        for node in queue:
+            self.delta[node] = {**self.delta[fail[node]], **goto[node]}
 
-    for i in drawing_secondary:
-        if i in item_name:
-            drawing_score += 5
+    # scores by item type of the keywords found in a name, each keyword counted once
+    def score(self, name):
+        delta = self.delta
+        output = self.output
+        found = set()
+        node = 0
+        for character in name:
+            node = delta[node].get(character, 0)
+            if output[node]:
+                found.update(output[node])
 
-    for i in ancient_literature_primary:
-        if i in item_name:
-            ancient_literature_score += 11
+        totals = [0, 0, 0]
+        for i in found:
+            scores = self.scores[i]
+            totals[0] += scores[0]
+            totals[1] += scores[1]
+            totals[2] += scores[2]
+        return totals
 
+
+matcher = KeywordMatcher(keyword_scores())
+classified = {}
+
+
+# item type of the scores by item type
+def item_type(calligraphy_score, drawing_score, ancient_literature_score):
     if max(calligraphy_score, drawing_score, ancient_literature_score) < 5:
         return "others"
     elif calligraphy_score > drawing_score:
@@ -172,3 +235,24 @@ def item_classifier(item_name):
         return "drawing"
     else:
         return "ancient_literature"
+
+
+# classifies items according to the keyword lists and scores
+def item_classifier(item_name):
+    result = classified.get(item_name)
+    if result is not None:
+        return result
+    if not isinstance(item_name, str):
+        raise TypeError("item name must be text, not " + type(item_name).__name__)
+
+    result = item_type(*matcher.score(item_name))
+    if len(classified) >= CLASSIFIED_LIMIT:
+        classified.clear()
+    classified[item_name] = result
+    return result
+
+
+# classifies a sequence of item names, each distinct name is scored once
+def classify_many(item_names):
+    types = {name: item_classifier(name) for name in dict.fromkeys(item_names)}
+    return [types[name] for name in item_names]
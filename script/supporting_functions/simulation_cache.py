@@ -0,0 +1,131 @@
+# Persistent cache of simulation results, keyed by the full parameter tuple and the simulator version
+
+import os
+import time
+import pickle
+import hashlib
+import inspect
+import sqlite3
+import numpy as np
+from contextlib import closing
+
+CACHE_PATH = "output/object/simulation_cache.sqlite"
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# arguments that never change a result
+UNKEYED = ("cache", "workers")
+
+
+# open the cache database and make sure the entries table exists
+def connect(path=CACHE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS entries "
+        "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)"
+    )
+    return connection
+
+
+# reproducible description of a random stream, None when it cannot be replayed (None or a Generator)
+# A SeedSequence is keyed by its entropy, so children spawned off fresh entropy are only worth keying when the caller
+# holds their root, sweeps check replayable on the root before keying its children
+def stream_key(rng):
+    if isinstance(rng, (int, np.integer)):
+        return "seed", int(rng)
+    if isinstance(rng, np.random.SeedSequence) and rng.entropy is not None:
+        entropy = rng.entropy if np.isscalar(rng.entropy) else tuple(rng.entropy)
+        return "SeedSequence", entropy, tuple(rng.spawn_key), rng.pool_size
+    return None
+
+
+# whether the streams spawned off rng repeat on the next call with the same rng, so their results can be cached
+def replayable(rng):
+    return stream_key(rng) is not None
+
+
+# content hash of a call with all defaults filled in, None when the call is not reproducible
+def make_key(func, version, kwargs):
+    bound = inspect.signature(func).bind(**kwargs)
+    bound.apply_defaults()
+
+    params = []
+    for name, value in sorted(bound.arguments.items()):
+        if name in UNKEYED:
+            continue
+        if name == "rng":
+            value = stream_key(value)
+            if value is None:
+                return None
+        elif isinstance(value, np.generic):
+            value = value.item()
+        elif isinstance(value, np.ndarray):
+            value = tuple(value.tolist())
+        params.append((name, value))
+
+    content = repr((func.__module__, func.__name__, version, params))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# cached value of a key as (found, value), a hit refreshes its last use for LRU eviction
+def lookup(key, path=CACHE_PATH):
+    with closing(connect(path)) as connection, connection:
+        row = connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+    return True, pickle.loads(row[0])
+
+
+# store a value under its key and evict least recently used entries beyond max_bytes
+def store(key, value, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+    blob = pickle.dumps(value)
+    with closing(connect(path)) as connection, connection:
+        connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, blob, len(blob), time.time()))
+    evict(path, max_bytes)
+
+
+# drop least recently used entries until the cached values fit into max_bytes
+def evict(path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+    with closing(connect(path)) as connection, connection:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > max_bytes:
+            rows = connection.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+            expired = []
+            for key, size in rows:
+                if total <= max_bytes:
+                    break
+                expired.append((key,))
+                total -= size
+            connection.executemany("DELETE FROM entries WHERE key = ?", expired)
+
+
+# remove the cached result of one call, returns whether an entry was removed
+def invalidate(func, version, path=CACHE_PATH, **kwargs):
+    key = make_key(func, version, kwargs)
+    if key is None:
+        return False
+    with closing(connect(path)) as connection, connection:
+        removed = connection.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount
+    return removed > 0
+
+
+# remove every cached result
+def clear(path=CACHE_PATH):
+    with closing(connect(path)) as connection, connection:
+        connection.execute("DELETE FROM entries")
+
+
+# call func(**kwargs) through the cache, calls without a reproducible rng are always computed
+def cached_call(func, version, kwargs, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+    key = make_key(func, version, kwargs)
+    if key is None:
+        return func(**kwargs)
+
+    found, value = lookup(key, path)
+    if not found:
+        value = func(**kwargs)
+        store(key, value, path, max_bytes)
+    return value
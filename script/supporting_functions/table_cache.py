@@ -0,0 +1,47 @@
+# Binary sidecars beside source workbooks, so each xlsx goes through pd.read_excel only once
+
+import os
+import pickle
+import pandas as pd
+from script.supporting_functions.ingest_manifest import file_signature
+
+SIDECAR_SUFFIX = '.pkl'
+
+
+# sidecar file beside a source workbook
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+# pd.read_excel(path, **kwargs), served from the sidecar while the workbook content and arguments are unchanged
+def read_excel(path, **kwargs):
+    sidecar = sidecar_path(path)
+    arguments = repr(sorted(kwargs.items()))
+
+    signature = None
+    if os.path.exists(sidecar):
+        try:
+            fileObj = open(sidecar, 'rb')
+            signature, cached_arguments, data = pickle.load(fileObj)
+            fileObj.close()
+            current = file_signature(path, signature)
+            if current[2] == signature[2] and cached_arguments == arguments:
+                return data
+            signature = current
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            signature = None
+
+    data = pd.read_excel(path, **kwargs)
+    if signature is None:
+        signature = file_signature(path)
+
+    # write to a temporary file first, so readers never see a partial sidecar
+    try:
+        temporary = sidecar + '.%d.tmp' % os.getpid()
+        fileObj = open(temporary, 'wb')
+        pickle.dump((signature, arguments, data), fileObj)
+        fileObj.close()
+        os.replace(temporary, sidecar)
+    except OSError as e:
+        print(e)
+    return data
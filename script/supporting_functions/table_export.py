@@ -0,0 +1,156 @@
+# Streaming export of tables to xlsx, csv or parquet under output/tables
+
+import os
+import math
+import numbers
+import datetime
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+EXPORT_PATH = "output/tables/"
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+
+# rows of a frame converted to xlsx cells at once, so a written frame is not copied as a whole into cell values
+XLSX_BLOCK_ROWS = 10000
+
+
+# value of a cell as the pandas excel writer stores it, missing values are left empty
+def cell_value(value):
+    if value is None or isinstance(value, str):
+        return value
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if math.isnan(value):
+            return None
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return value
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value
+    return str(value)
+
+
+# column of a frame => list of cell values, numeric columns are converted without a per-cell type check
+def column_values(column):
+    if column.dtype.kind in "iub":
+        return column.tolist()
+    if column.dtype.kind == "f":
+        values = column.to_numpy(dtype=object)
+        values[column.isna().to_numpy()] = None
+        if np.isinf(column.to_numpy()).any():
+            return [cell_value(value) for value in values]
+        return values.tolist()
+    return [cell_value(value) for value in column.tolist()]
+
+
+# Table written chunk by chunk to output/tables/<name>.<format>, only the current chunk is held in memory, and xlsx
+# rows go to the write-only sheet block by block as they are converted
+# Parquet chunks are written as part files and merged on close, so a column holding text in any chunk is text
+class TableWriter:
+    def __init__(self, name, export_format="xlsx"):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError("unknown export format " + str(export_format))
+        self.filepath = EXPORT_PATH + name + "." + export_format
+        self.export_format = export_format
+        self.columns = None
+        self.rows = 0
+        self.writer = None
+        self.parts = []
+        self.text = set()
+
+        if export_format == "xlsx":
+            self.writer = Workbook(write_only=True)
+            self.sheet = self.writer.create_sheet("Sheet1")
+
+    # append the rows of a frame, the first frame sets the header
+    def write(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+            self.write_header()
+        if self.export_format == "xlsx":
+            for start in range(0, len(frame), XLSX_BLOCK_ROWS):
+                block = frame.iloc[start:start + XLSX_BLOCK_ROWS]
+                for row in zip(*[column_values(block[name]) for name in block.columns]):
+                    self.sheet.append(row)
+        elif self.export_format == "csv":
+            frame.to_csv(self.filepath, mode="a", header=False, index=False)
+        else:
+            self.write_parquet(frame)
+        self.rows += len(frame)
+
+    # header styled as the pandas excel writer does
+    def write_header(self):
+        if self.export_format == "xlsx":
+            side = Side(style="thin")
+            header = []
+            for name in self.columns:
+                cell = WriteOnlyCell(self.sheet, value=str(name))
+                cell.font = Font(bold=True)
+                cell.border = Border(left=side, right=side, top=side, bottom=side)
+                cell.alignment = Alignment(horizontal="center", vertical="top")
+                header.append(cell)
+            self.sheet.append(header)
+        elif self.export_format == "csv":
+            pd.DataFrame(columns=self.columns).to_csv(self.filepath, index=False)
+
+    # write a frame as a parquet part file with object columns as text
+    def write_parquet(self, frame):
+        part = self.filepath + ".%d.part" % len(self.parts)
+        frame = parquet_frame(frame, [column for column in frame.columns if frame[column].dtype == object], False)
+        frame.to_parquet(part, index=False)
+        self.parts.append(part)
+        self.text.update(column for column in frame.columns if frame[column].dtype == object)
+
+    # merge the part files into one file, a column is text if it is text in any part
+    def merge_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = None
+        for part in self.parts:
+            frame = parquet_frame(pd.read_parquet(part), self.text)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if schema is None:
+                schema = pa.schema([pa.field(name, pa.string()) if name in self.text or pa.types.is_null(type)
+                                    else pa.field(name, type) for name, type in zip(table.schema.names, table.schema.types)])
+                self.writer = pq.ParquetWriter(self.filepath, schema)
+            self.writer.write_table(table.cast(schema))
+            os.remove(part)
+        if self.writer is not None:
+            self.writer.close()
+
+    # finish the file, returns its path
+    def close(self):
+        if self.export_format == "xlsx":
+            self.writer.save(self.filepath)
+        elif self.export_format == "parquet":
+            self.merge_parquet()
+        return self.filepath
+
+
+# frame => frame with the given columns as text and, if numeric is True, the other numeric columns as float64
+def parquet_frame(frame, text, numeric=True):
+    frame = frame.copy()
+    for column in frame.columns:
+        if column in text:
+            values = [cell_value(value) for value in frame[column].tolist()]
+            frame[column] = pd.Series([None if value is None else str(value) for value in values], dtype=object)
+        elif numeric and frame[column].dtype.kind in "iuf":
+            frame[column] = frame[column].astype(np.float64)
+    return frame
+
+
+# frame => output/tables/<name>.<format>
+def export_table(frame, name, export_format="xlsx"):
+    writer = TableWriter(name, export_format)
+    writer.write(frame)
+    return writer.close()
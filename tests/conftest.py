@@ -0,0 +1,5 @@
+# tests import the repository modules from the repository root, as the scripts do
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from script.supporting_functions.auction_dataset import AuctionDataset, DatasetWriter
+
+
+# two chunks of inferred auctions, the second turns rule into reals and index into text
+def chunks():
+    first = pd.DataFrame({
+        "auction_no": ["1001", "1001", "1002"],
+        "overtime_rule": [60, 180, 180],
+        "index": [1, 2, 3],
+        "name": ["山水图", None, 7.5],
+        "is_overtime_item": [True, False, True],
+        "bids": [[[1, 100, 1000.0], [2, 150.5, 1010]], [], [[3, 200, 1020.0]]],
+        "list_bidders": [{1, 2}, set(), {3}],
+    })
+    second = pd.DataFrame({
+        "auction_no": ["4001", "4001"],
+        "overtime_rule": [60.0, 90.5],
+        "index": ["LOT4", 5],
+        "name": ["花鸟画", "文稿册"],
+        "is_overtime_item": [False, True],
+        "bids": [[[4, 300, 1030.0]], [[5, 400.0, 1040], [1, 450, 1050.0]]],
+        "list_bidders": [{4}, {1, 5}],
+    })
+    return first, second
+
+
+# dataset of both chunks saved under path
+def saved(path):
+    writer = DatasetWriter(str(path))
+    for chunk in chunks():
+        writer.write(chunk)
+    writer.close()
+    return AuctionDataset.load(str(path))
+
+
+def test_round_trip_keeps_values_and_types(tmp_path):
+    read = saved(tmp_path).read()
+    expected = pd.concat(chunks(), ignore_index=True)
+    assert list(read.columns) == list(expected.columns)
+    assert read["overtime_rule"].dtype == np.float64
+    assert read["is_overtime_item"].dtype == bool
+    for name in expected.columns:
+        assert repr(read[name].tolist()) == repr(expected[name].tolist()), name
+
+
+def test_memory_map_and_copy_read_alike(tmp_path):
+    saved(tmp_path)
+    mapped = AuctionDataset.load(str(tmp_path)).read()
+    copied = AuctionDataset.load(str(tmp_path), mmap=False).read()
+    assert repr(mapped.to_dict("list")) == repr(copied.to_dict("list"))
+
+
+def test_filters_select_rows_and_keep_their_positions(tmp_path):
+    dataset = saved(tmp_path)
+    read = dataset.read(["auction_no", "bids"], [("overtime_rule", "==", 60)])
+    assert read.index.tolist() == [0, 3]
+    assert read["auction_no"].tolist() == ["1001", "4001"]
+    assert read["bids"].tolist() == [[[1, 100, 1000.0], [2, 150.5, 1010]], [[4, 300, 1030.0]]]
+
+    assert dataset.read(["index"], [("auction_no", "in", {"1002", "4001"})]).index.tolist() == [2, 3, 4]
+    assert dataset.read(["index"], [("auction_no", "not in", ["1001"]), ("overtime_rule", ">", 60)])[
+        "index"].tolist() == [3, 5]
+    assert dataset.read(["index"], [("is_overtime_item", "==", True), ("overtime_rule", "<=", 90.5)]).index.tolist() \
+        == [0, 4]
+    assert len(dataset.read(filters=[("overtime_rule", ">=", 1000)])) == 0
+
+
+def test_bad_reads(tmp_path):
+    dataset = saved(tmp_path)
+    with pytest.raises(KeyError):
+        dataset.read(["winner"])
+    with pytest.raises(ValueError):
+        dataset.read(filters=[("overtime_rule", "~", 60)])
+    with pytest.raises(ValueError):
+        dataset.read(filters=[("bids", "==", [])])
+
+
+def test_empty_dataset(tmp_path):
+    DatasetWriter(str(tmp_path)).close()
+    dataset = AuctionDataset.load(str(tmp_path))
+    assert len(dataset) == 0
+    assert dataset.read().empty
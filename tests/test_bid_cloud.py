@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from script.supporting_functions import bid_cloud
+
+
+# bid columns of four items, items 0 and 2 under one overtime rule and items 1 and 3 under another
+def bid_columns(overtime_rule):
+    offsets = np.array([0, 2, 3, 3, 6], dtype=np.int64)
+    bids_time = np.array([-30.0, -10.0, -5.0, -20.0, 0.0, 15.0])
+    bids_price = np.array([100.0, 200.0, 150.0, 300.0, 400.0, 500.0])
+    bidder = np.array([1, 2, 3, 1, 2, 1], dtype=np.int64)
+    return bid_cloud.by_rule(overtime_rule, bids_time, bids_price, bidder, offsets)
+
+
+def test_by_rule_splits_items_by_rule_in_order_of_first_item():
+    tables = bid_columns([180, 60, 180, 60])
+    assert list(tables) == [180, 60]
+    assert tables[180].item_id.tolist() == [0, 0]
+    assert tables[180].sizes().tolist() == [2, 0]
+    assert tables[60].item_id.tolist() == [1, 3, 3, 3]
+    assert tables[60][1]['bids_price'].tolist() == [300.0, 400.0, 500.0]
+    with pytest.raises(IndexError):
+        tables[60][2]
+
+
+def test_merge_moves_item_ids_past_earlier_parts():
+    merged = bid_cloud.merge([bid_columns([180, 60, 180, 60]), bid_columns([60, 60, 60, 60])], [4, 4])
+    assert len(merged[180]) == 2
+    assert len(merged[60]) == 6
+    assert merged[60].item_id.tolist() == [1, 3, 3, 3, 4, 4, 5, 7, 7, 7]
+    assert merged[60][2]['bidder'].tolist() == [1, 2]
+
+
+@pytest.mark.parametrize("overtime_rule", [[180, 60, 180, 60], [180.0, 60.0, 180.0, 60.0], [180.0, 90.5, 180.0, 90.5]])
+def test_save_and_load_round_trip(tmp_path, overtime_rule):
+    tables = bid_columns(overtime_rule)
+    bid_cloud.save(tables, str(tmp_path))
+    for mmap in (True, False):
+        loaded = bid_cloud.load(str(tmp_path), mmap)
+        assert list(loaded) == list(tables)
+        for rule, table in tables.items():
+            for name in bid_cloud.COLUMNS:
+                np.testing.assert_array_equal(getattr(loaded[rule], name), getattr(table, name))
+
+
+def test_integral_float_rules_are_int_keys(tmp_path):
+    tables = bid_columns([180.0, 60.0, 180.0, 60.0])
+    assert [type(rule) for rule in tables] == [int, int]
+    bid_cloud.save(tables, str(tmp_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['180', '60', 'rules.npy']
+    assert list(bid_cloud.load(str(tmp_path))) == [180, 60]
+
+
+def test_writer_appends_chunks_as_merge_joins_them(tmp_path):
+    parts = [bid_columns([180, 60, 180, 60]), {}, bid_columns([60.0, 90.5, 60.0, 60.0])]
+    counts = [4, 2, 4]
+    writer = bid_cloud.BidCloudWriter(str(tmp_path))
+    for part, count in zip(parts, counts):
+        writer.write(part, count)
+    writer.close()
+
+    merged = bid_cloud.merge(parts, counts)
+    loaded = bid_cloud.load(str(tmp_path))
+    assert list(loaded) == [180, 60, 90.5]
+    for rule, table in merged.items():
+        for name in bid_cloud.COLUMNS:
+            np.testing.assert_array_equal(getattr(loaded[rule], name), getattr(table, name))
+
+
+def test_writer_without_chunks(tmp_path):
+    bid_cloud.BidCloudWriter(str(tmp_path)).close()
+    assert bid_cloud.load(str(tmp_path)) == {}
@@ -0,0 +1,34 @@
+import numpy as np
+from script.supporting_functions.bid_store import BidStore, BidStoreWriter, COLUMNS
+
+
+# per-item bids lists of three chunks, with items without bids
+def chunks():
+    return [
+        [[[1, 100.0, 1000], [2, 150.5, 1010]], []],
+        [],
+        [[[3, 200.0, 1020]], [[4, 300.0, 1030], [1, 350.0, 1040], [2, 400.0, 1050]], []],
+    ]
+
+
+def test_store_written_in_chunks_equals_the_store_of_all_items(tmp_path):
+    writer = BidStoreWriter(str(tmp_path))
+    for chunk in chunks():
+        writer.write(chunk)
+    writer.close()
+
+    expected = BidStore.from_bids([bids for chunk in chunks() for bids in chunk])
+    for mmap in (True, False):
+        store = BidStore.load(str(tmp_path), mmap)
+        assert len(store) == 5
+        for name in COLUMNS:
+            assert getattr(store, name).dtype == getattr(expected, name).dtype
+            np.testing.assert_array_equal(getattr(store, name), getattr(expected, name))
+        assert store.to_list(3) == [[4, 300.0, 1030], [1, 350.0, 1040], [2, 400.0, 1050]]
+
+
+def test_store_without_items(tmp_path):
+    BidStoreWriter(str(tmp_path)).close()
+    store = BidStore.load(str(tmp_path))
+    assert len(store) == 0
+    assert store.offsets.tolist() == [0]
@@ -0,0 +1,71 @@
+import pandas as pd
+import process_data
+from script import stage_1
+from script.supporting_functions import bid_validation
+from script.supporting_functions.bidder_registry import BidderRegistry
+
+
+# recorded item of the standard format
+def standard_item(bids, start_bid=100, close_time=1000.0, overtime_rule=60):
+    return {"auction_house": 1, "auction_no": "1001", "overtime_rule": overtime_rule, "index": "LOT1",
+            "name": "山水图", "start_bid": start_bid, "close_time": close_time, "bids": bids}
+
+
+# special format workbook of one auction with its tag table, bids of an item listed from the latest to the earliest
+def special_files(path):
+    tag = pd.DataFrame([[4, 4001, 60, 1, 20220301200000]], columns=["house", "auction_no", "rule", "index", "close"])
+    tag.to_excel(path / "tag.xlsx", index=False)
+    rows = [[1, "花鸟画", "x", "u2", 300, "2022-03-01 19:59:00"],
+            [1, "花鸟画", "x", "u1", 200, "2022-03-01 19:58:00"],
+            [1, "花鸟画", "x", "u2", 150, "2022-03-01 19:57:00"]]
+    data = pd.DataFrame(rows, columns=["item", "name", "misc", "bidder", "price", "time"])
+    data.to_excel(path / "4001_special.xlsx", index=False)
+
+
+def test_clean_standard_item_has_no_report_rows():
+    report = bid_validation.validation_report([standard_item([[1, 100, 900.0], [2, 200, 950.0]])])
+    assert len(report) == 0
+
+
+def test_bid_below_start_bid_is_reported():
+    report = bid_validation.validation_report([standard_item([[1, 50, 900.0], [2, 200, 950.0]])])
+    assert report["rule"].tolist() == [bid_validation.START_BID_ABOVE_FIRST_BID]
+    assert report["bid_price"].tolist() == [50]
+
+
+def test_price_not_monotone_in_time_is_reported():
+    report = bid_validation.validation_report([standard_item([[1, 100, 950.0], [2, 200, 900.0]])])
+    assert report["rule"].tolist() == [bid_validation.PRICE_NOT_MONOTONE_IN_TIME]
+    assert report["bid_price"].tolist() == [200]
+
+
+def test_duplicate_bid_is_reported_once():
+    report = bid_validation.validation_report([standard_item([[1, 100, 900.0], [1, 100, 900.0]])])
+    assert report["rule"].tolist() == [bid_validation.DUPLICATE_BID]
+
+
+def test_bids_after_final_close_are_reported():
+    # the second bid extends the close to 1050, the third comes after it and so does every bid after that
+    bids = [[1, 100, 990.0], [2, 200, 1040.0], [1, 300, 1200.0], [2, 400, 1210.0]]
+    report = bid_validation.validation_report([standard_item(bids)])
+    assert report["rule"].tolist() == [bid_validation.BID_AFTER_FINAL_CLOSE] * 2
+    assert report["bid_price"].tolist() == [300, 400]
+
+
+def test_report_rows_point_at_their_item():
+    recorded_object = [standard_item([[1, 100, 900.0]]), standard_item([[1, 50, 900.0]])]
+    report = bid_validation.validation_report(recorded_object)
+    assert report["item"].tolist() == [1]
+
+
+def test_clean_special_item_has_no_report_rows(tmp_path):
+    special_files(tmp_path)
+    auction_data = stage_1.parse_auction_special(str(tmp_path) + "/", "4001_special.xlsx", "tag.xlsx",
+                                                 BidderRegistry())
+    assert len(auction_data) == 1
+    start_recorded = process_data.start_bid_recorded([(process_data.SPECIAL_PATH + "4001_special.xlsx",
+                                                       auction_data, [])])
+    assert start_recorded == [False]
+    assert len(bid_validation.validation_report(auction_data)) == 2
+    report = bid_validation.validation_report(auction_data, start_recorded)
+    assert len(report) == 0
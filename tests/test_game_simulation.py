@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import game_simulation
+
+
+def test_halving_k_spends_a_fraction_of_the_scan(monkeypatch):
+    rounds = []
+    simulate_rounds = game_simulation.simulate_rounds
+
+    def counted(n, *args):
+        rounds.append(n)
+        return simulate_rounds(n, *args)
+
+    monkeypatch.setattr(game_simulation, "simulate_rounds", counted)
+    best_k_p, best_p, best_k_profit, best_profit = game_simulation.halving_k(1000, batched=True, rng=1)
+    assert sum(rounds) * 10 < 19 * 1000
+    assert 1 <= best_k_p <= 19 and 1 <= best_k_profit <= 19
+    assert len(best_p) == 3 and len(best_profit) == 3
+    assert game_simulation.halving_k(1000, batched=True, rng=1) == (best_k_p, best_p, best_k_profit, best_profit)
+
+
+def test_halving_k_with_fewer_rounds_than_the_first_rung():
+    best_k_p, best_p, best_k_profit, best_profit = game_simulation.halving_k(4, k_range=(3, 5), batched=True, rng=2)
+    assert 3 <= best_k_p <= 5 and 3 <= best_k_profit <= 5
+
+
+def test_monte_carlo_stream_summarises_every_round():
+    summary = game_simulation.monte_carlo_stream(250, chunk_size=100, rng=3)
+    assert summary["n"] == 250
+    for name in ("p", "t", "profit"):
+        assert summary[name]["bin_counts"].sum() == 250
+        assert len(summary[name]["bin_edges"]) == len(summary[name]["bin_counts"]) + 1
+        assert summary[name]["min"] <= summary[name]["mean"] <= summary[name]["max"]
+
+
+def test_monte_carlo_stream_without_rounds_is_empty():
+    for n in (0, -5):
+        summary = game_simulation.monte_carlo_stream(n)
+        assert summary["n"] == 0
+        for name in ("p", "t", "profit"):
+            assert np.isnan(summary[name]["mean"])
+            assert len(summary[name]["bin_counts"]) == 0
+
+
+def test_halving_k_needs_growing_rungs():
+    for eta in (1, 0.5, 0):
+        with pytest.raises(ValueError):
+            game_simulation.halving_k(200, eta=eta, rng=1, k_range=(1, 4))
+    with pytest.raises(ValueError):
+        game_simulation.find_k(200, search="halving", eta=1, rng=1)
+
+
+def test_halving_k_with_fractional_eta_simulates_whole_rounds(monkeypatch):
+    rounds = []
+    simulate_rounds = game_simulation.simulate_rounds
+
+    def counted(n, *args):
+        rounds.append(n)
+        return simulate_rounds(n, *args)
+
+    monkeypatch.setattr(game_simulation, "simulate_rounds", counted)
+    game_simulation.halving_k(200, eta=1.5, batched=True, rng=1, k_range=(1, 4))
+    assert all(isinstance(n, int) for n in rounds)
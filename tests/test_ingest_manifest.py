@@ -0,0 +1,76 @@
+import os
+from script.supporting_functions.ingest_manifest import IngestManifest
+
+VERSION = 2
+
+
+# auction file with its content, and a manifest keeping its caches under the test directory
+def setup_files(tmp_path):
+    workbook = tmp_path / "1001.xlsx"
+    workbook.write_bytes(b"first content")
+    tag = tmp_path / "tag.xlsx"
+    tag.write_bytes(b"tag table")
+    return str(workbook), str(tag), IngestManifest(str(tmp_path / "cache"))
+
+
+# manifest saved at the end of a run and loaded by the next one
+def next_run(manifest, tmp_path):
+    manifest.save(str(tmp_path / "manifest.obj"))
+    return IngestManifest.load(str(tmp_path / "manifest.obj"))
+
+
+def test_parsed_file_is_current_until_it_changes(tmp_path):
+    workbook, tag, manifest = setup_files(tmp_path)
+    assert not manifest.is_parsed(workbook, (workbook, tag), VERSION)
+    manifest.update_parsed(workbook, (workbook, tag), VERSION, ([], []))
+    assert manifest.is_parsed(workbook, (workbook, tag), VERSION)
+    assert manifest.parsed(workbook, (workbook, tag), VERSION) == ([], [])
+    assert not manifest.is_parsed(workbook, (workbook, tag), VERSION + 1)
+
+    manifest = next_run(manifest, tmp_path)
+    with open(tag, "wb") as fileObj:
+        fileObj.write(b"other tag table")
+    assert not manifest.is_parsed(workbook, (workbook, tag), VERSION)
+    assert manifest.parsed(workbook, (workbook, tag), VERSION) is None
+
+
+def test_prune_keeps_signatures_of_ingested_files(tmp_path):
+    workbook, tag, manifest = setup_files(tmp_path)
+    manifest.update_parsed(workbook, (workbook, tag), VERSION, ([], []))
+
+    manifest = next_run(manifest, tmp_path)
+    manifest.prune([workbook], [workbook, tag])
+    assert set(manifest.signatures) == {workbook, tag}
+
+    # same size and mtime, so the saved signature is trusted and the content is not hashed again
+    stat = os.stat(workbook)
+    with open(workbook, "wb") as fileObj:
+        fileObj.write(b"other content")
+    os.utime(workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert manifest.is_parsed(workbook, (workbook, tag), VERSION)
+
+
+def test_prune_forgets_files_no_longer_ingested(tmp_path):
+    workbook, tag, manifest = setup_files(tmp_path)
+    manifest.update_parsed(workbook, (workbook,), VERSION, ([], []))
+    manifest.update_inferred(workbook, [1, 2], 3, ([], [], {}))
+    assert manifest.inferred(workbook, [1, 2], 3) == ([], [], {})
+
+    manifest = next_run(manifest, tmp_path)
+    manifest.prune([], [])
+    assert workbook not in manifest
+    assert manifest.signatures == {}
+    assert not os.path.exists(manifest.cache_file(workbook, "parsed"))
+    assert not os.path.exists(manifest.cache_file(workbook, "inferred"))
+
+
+def test_inferred_rows_need_the_same_bidder_ids_and_version(tmp_path):
+    workbook, tag, manifest = setup_files(tmp_path)
+    manifest.update_parsed(workbook, (workbook,), VERSION, ([], []))
+    manifest.update_inferred(workbook, [1, 2], 3, ([], [], {}))
+    assert manifest.inferred(workbook, [1, 3], 3) is None
+    assert manifest.inferred(workbook, [1, 2], 4) is None
+
+    # a new parse drops the stage 2 rows of the old content
+    manifest.update_parsed(workbook, (workbook,), VERSION, ([], []))
+    assert manifest.inferred(workbook, [1, 2], 3) is None
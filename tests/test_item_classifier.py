@@ -0,0 +1,68 @@
+import random
+import pytest
+from script.supporting_functions import item_classifier
+from script.supporting_functions.item_classifier import (KeywordMatcher, keyword_scores, calligraphy_primary,
+                                                         drawing_primary, drawing_secondary,
+                                                         ancient_literature_primary)
+
+
+# classifier as it was before the keyword automaton, one substring search per keyword
+def reference_classifier(item_name):
+    calligraphy_score = 0
+    drawing_score = 0
+    ancient_literature_score = 0
+    for i in calligraphy_primary:
+        if i in item_name:
+            calligraphy_score += 15
+    for i in drawing_primary:
+        if i in item_name:
+            drawing_score += 8
+    for i in drawing_secondary:
+        if i in item_name:
+            drawing_score += 5
+    for i in ancient_literature_primary:
+        if i in item_name:
+            ancient_literature_score += 11
+    return item_classifier.item_type(calligraphy_score, drawing_score, ancient_literature_score)
+
+
+# item names made of keywords, pieces of keywords and other characters, so keywords overlap and repeat
+def item_names(count, seed=0):
+    rng = random.Random(seed)
+    keywords = calligraphy_primary + drawing_primary + drawing_secondary + ancient_literature_primary
+    pieces = keywords + [keyword[:-1] for keyword in keywords if len(keyword) > 1]
+    pieces += list("清明上河图之的一二 ABC0")
+    return ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 8))) for _ in range(count)]
+
+
+def test_matcher_scores_as_substring_search():
+    names = item_names(3000) + calligraphy_primary + drawing_primary + drawing_secondary + ancient_literature_primary
+    for name in names + [""]:
+        assert item_classifier.item_classifier(name) == reference_classifier(name), name
+
+
+def test_matcher_finds_overlapping_keywords():
+    matcher = KeywordMatcher({"ab": [1, 0, 0], "b": [0, 2, 0], "bc": [0, 0, 4], "abcd": [8, 0, 0]})
+    assert matcher.score("abcd") == [9, 2, 4]
+    assert matcher.score("xbcbc") == [0, 2, 4]
+    assert matcher.score("") == [0, 0, 0]
+
+
+def test_keyword_listed_twice_scores_twice(monkeypatch):
+    monkeypatch.setattr(item_classifier, "KEYWORD_WEIGHTS", [(["画", "画"], "drawing", 5), (["画"], "drawing", 8),
+                                                              (["书"], "calligraphy", 15)])
+    assert keyword_scores() == {"画": [0, 18, 0], "书": [15, 0, 0]}
+    assert KeywordMatcher(keyword_scores()).score("书画") == [15, 18, 0]
+
+
+def test_classify_many_keeps_order_and_repeats():
+    names = item_names(200, seed=1)
+    names = names + names[::-1]
+    assert item_classifier.classify_many(names) == [reference_classifier(name) for name in names]
+
+
+def test_names_must_be_text():
+    with pytest.raises(TypeError):
+        item_classifier.item_classifier(1234)
+    with pytest.raises(TypeError):
+        reference_classifier(1234)
@@ -0,0 +1,25 @@
+import process_data
+
+
+def test_pipeline_workers_do_not_exceed_the_cpus():
+    assert process_data.pipeline_workers(8, 8, cpus=8) == (4, 4)
+    assert process_data.pipeline_workers(6, 2, cpus=4) == (3, 1)
+    assert process_data.pipeline_workers(1, 1, cpus=1) == (1, 0)
+    assert process_data.pipeline_workers(4, 4, cpus=2) == (1, 1)
+    assert process_data.pipeline_workers(2, 2, cpus=8) == (2, 2)
+
+
+def test_inference_pool_starts_only_for_two_or_more_files():
+    pool = process_data.InferencePool(2)
+    try:
+        assert pool.get(0) is None
+        assert pool.get(1) is None
+        assert pool.executor is None
+        executor = pool.get(2)
+        assert executor is not None
+        assert pool.get(3) is executor
+    finally:
+        pool.shutdown()
+    assert pool.executor is None
+    assert process_data.InferencePool(1).get(5) is None
+    assert process_data.InferencePool(0).get(5) is None
@@ -0,0 +1,68 @@
+import sqlite3
+import numpy as np
+import game_simulation
+from script.supporting_functions import simulation_cache
+
+
+# cheap stand-in for a simulation, the result depends on its parameters and stream only
+def draw(scale=1.0, rng=None, cache=False):
+    return scale * float(np.random.default_rng(rng).random())
+
+
+# number of cached results
+def cached_rows(path=simulation_cache.CACHE_PATH):
+    connection = sqlite3.connect(path)
+    rows = connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    connection.close()
+    return rows
+
+
+def test_stream_key_of_replayable_streams():
+    assert simulation_cache.stream_key(7) == ("seed", 7)
+    assert simulation_cache.stream_key(np.int64(7)) == ("seed", 7)
+    child = np.random.SeedSequence(7).spawn(2)[1]
+    assert simulation_cache.stream_key(child) == ("SeedSequence", 7, (1,), child.pool_size)
+
+
+def test_streams_without_seed_are_not_replayable():
+    assert simulation_cache.stream_key(None) is None
+    assert simulation_cache.stream_key(np.random.default_rng(7)) is None
+    assert not simulation_cache.replayable(None)
+    assert not simulation_cache.replayable(np.random.default_rng(7))
+    assert simulation_cache.replayable(7)
+
+
+def test_make_key_covers_defaults_and_ignores_unkeyed_arguments():
+    key = simulation_cache.make_key(draw, 1, {"rng": 7})
+    assert key == simulation_cache.make_key(draw, 1, {"rng": 7, "scale": 1.0, "cache": True})
+    assert key != simulation_cache.make_key(draw, 1, {"rng": 7, "scale": 2.0})
+    assert key != simulation_cache.make_key(draw, 2, {"rng": 7})
+    assert key != simulation_cache.make_key(draw, 1, {"rng": 8})
+    assert simulation_cache.make_key(draw, 1, {"rng": None}) is None
+
+
+def test_cached_call_reads_back_the_stored_result(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    value = simulation_cache.cached_call(draw, 1, {"rng": 7}, path)
+    assert cached_rows(path) == 1
+    assert simulation_cache.cached_call(draw, 1, {"rng": 7}, path) == value
+    assert simulation_cache.invalidate(draw, 1, path, rng=7)
+    assert cached_rows(path) == 0
+
+
+def test_sweep_is_cached_under_a_seed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    jobs = [{"scale": 1.0}, {"scale": 2.0}]
+    first = game_simulation.run_sweep(draw, [(0,), (1,)], jobs, rng=7, cache=True)
+    assert cached_rows() == 2
+    assert game_simulation.run_sweep(draw, [(0,), (1,)], jobs, rng=7, cache=True) == first
+    assert cached_rows() == 2
+
+
+def test_sweep_without_seed_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    simulation_cache.clear()
+    jobs = [{"scale": 1.0}, {"scale": 2.0}]
+    game_simulation.run_sweep(draw, [(0,), (1,)], jobs, rng=None, cache=True)
+    game_simulation.run_sweep(draw, [(0,), (1,)], jobs, rng=np.random.default_rng(7), cache=True)
+    assert cached_rows() == 0
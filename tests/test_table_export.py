@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+from script.supporting_functions import table_export
+
+
+# two chunks of a table with integers, reals, missing values and text
+def chunks():
+    first = pd.DataFrame({"item": [1, 2, 3, 4], "price": [1.5, np.nan, 3.0, 4.25], "name": ["a", None, "c", "d"]})
+    second = pd.DataFrame({"item": [5, 6, 7], "price": [7.0, 8.5, 9.0], "name": ["e", "f", "g"]})
+    return first, second
+
+
+@pytest.mark.parametrize("export_format", ["xlsx", "csv"])
+def test_table_written_in_chunks_reads_back_whole(tmp_path, monkeypatch, export_format):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(table_export, "XLSX_BLOCK_ROWS", 3)
+    (tmp_path / "output" / "tables").mkdir(parents=True)
+
+    writer = table_export.TableWriter("table", export_format)
+    for chunk in chunks():
+        writer.write(chunk)
+    path = writer.close()
+
+    read = pd.read_excel(path) if export_format == "xlsx" else pd.read_csv(path)
+    expected = pd.concat(chunks(), ignore_index=True)
+    assert writer.rows == len(expected)
+    assert read["item"].tolist() == expected["item"].tolist()
+    np.testing.assert_array_equal(read["price"].to_numpy(), expected["price"].to_numpy())
+    assert read["name"].isna().tolist() == expected["name"].isna().tolist()
+
+
+def test_unknown_export_format():
+    with pytest.raises(ValueError):
+        table_export.TableWriter("table", "ods")